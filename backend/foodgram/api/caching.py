@@ -0,0 +1,110 @@
+"""Кеш ответов списка и карточки рецепта для анонимных пользователей.
+
+Ключ строится из хоста, пути, отсортированной строки запроса, формата
+ответа и штампа поколения. Изменение рецептов, тегов, ингредиентов или
+авторов меняет поколение, и старые ответы перестают читаться, а из
+кеша уходят по таймауту. Пересчёт горячего ключа ведёт один процесс,
+остальные ждут его результат. Ответ для кеша читается из основной
+базы: отставшая реплика положила бы старые данные под новое поколение.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from foodgram.db_router import use_primary
+
+GENERATION_KEY = 'recipe_responses:generation'
+RESPONSE_KEY = 'recipe_responses:{}:{}'
+LOCK_KEY = 'recipe_responses:lock:{}'
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, uuid4().hex, None)
+
+
+def current_generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, uuid4().hex, None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def response_key(request):
+    query = urlencode(sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values
+    ))
+    address = (
+        f'{request.get_host()}{request.path}?{query}'
+        f'#{request.accepted_renderer.format}'
+    )
+    return RESPONSE_KEY.format(
+        current_generation(), hashlib.md5(address.encode()).hexdigest()
+    )
+
+
+def wait_for(key):
+    """Ждёт, пока ответ посчитает процесс, взявший блокировку."""
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    return None
+
+
+class AnonymousResponseCacheMixin:
+    """Кеширует ответы list и retrieve на анонимные GET-запросы."""
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if (not settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+                or not request.user.is_anonymous):
+            return handler(request, *args, **kwargs)
+        key = response_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            lock = LOCK_KEY.format(key)
+            if cache.add(lock, 1, LOCK_TIMEOUT):
+                try:
+                    with use_primary():
+                        response = handler(request, *args, **kwargs)
+                    return self.render_to_cache(key, response)
+                finally:
+                    cache.delete(lock)
+            cached = wait_for(key)
+            if cached is None:
+                return handler(request, *args, **kwargs)
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    def render_to_cache(self, key, response):
+        if response.status_code != 200:
+            return response
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        cache.set(
+            key,
+            (response.content, response['Content-Type']),
+            settings.RECIPE_RESPONSE_CACHE_TIMEOUT,
+        )
+        return response
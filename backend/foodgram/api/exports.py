@@ -0,0 +1,276 @@
+import csv
+import hashlib
+import json
+
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+from recipes.models import ShoppingCartTotal
+
+CHUNK_SIZE = 64 * 1024
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+# Кириллица cp1251 в глифы стандартного шрифта (имена из Adobe Glyph List).
+PDF_CYRILLIC_DIFFERENCES = (
+    '168 /afii10023 184 /afii10071 185 /afii61352 192 '
+    + ' '.join(f'/afii{code}' for code in range(10017, 10050)
+               if code != 10023)
+    + ' '
+    + ' '.join(f'/afii{code}' for code in range(10065, 10098)
+               if code != 10071)
+)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Согласует формат выгрузки списка покупок.
+
+    Сам файл отдаётся потоком из представления, рендерер нужен для
+    выбора формата по параметру format или заголовку Accept и для
+    ответов об ошибках.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
+
+
+def shopping_list_rows(user):
+    """Суммы ингредиентов из корзины в детерминированном порядке."""
+    return ShoppingCartTotal.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        volume=F('amount'),
+    ).order_by(
+        'ingredient__name',
+        'ingredient__measurement_unit'
+    ).iterator()
+
+
+def shopping_list_etag(user, export_format, today):
+    """ETag по строкам итогов корзины, формату и дате выгрузки.
+
+    Хешируются сами строки с названиями: итогов у пользователя немного,
+    а сводные суммы совпадают у разных корзин.
+    """
+    digest = hashlib.sha1(repr((
+        export_format, f'{today:%Y-%m-%d}', user.get_full_name()
+    )).encode('utf-8'))
+    for row in ShoppingCartTotal.objects.filter(
+        user=user, amount__gt=0
+    ).order_by('ingredient_id').values_list(
+        'ingredient_id',
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).iterator():
+        digest.update(repr(row).encode('utf-8'))
+    return f'"{digest.hexdigest()}"'
+
+
+def buffered(chunks, size=CHUNK_SIZE):
+    """Склеивает мелкие куски в блоки около size символов."""
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield buffer[0][:0].join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield buffer[0][:0].join(buffer)
+
+
+def format_line(row):
+    return (f'- {row["ingredient__name"]} '
+            f'({row["ingredient__measurement_unit"]})'
+            f' - {row["volume"]}')
+
+
+def export_txt(rows, user, today):
+    yield (
+        f'Список покупок для: {user.get_full_name()}\n\n'
+        f'Дата: {today:%Y-%m-%d}\n\n'
+    )
+    separator = ''
+    for row in rows:
+        yield separator + format_line(row)
+        separator = '\n'
+    yield f'\n\nFoodgram ({today:%Y})'
+
+
+class Echo:
+    """Псевдофайл для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(rows, user, today):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow((
+            row['ingredient__name'],
+            row['ingredient__measurement_unit'],
+            row['volume'],
+        ))
+
+
+def export_json(rows, user, today):
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps({
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['volume'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def pdf_string(text):
+    encoded = text.encode('cp1251', errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(
+        b'(', b'\\('
+    ).replace(b')', b'\\)') + b')'
+
+
+def pdf_page_content(lines):
+    commands = [
+        b'BT',
+        b'/F1 %d Tf' % PDF_FONT_SIZE,
+        b'%d TL' % PDF_LEADING,
+        b'%d %d Td' % (PDF_MARGIN, PDF_PAGE_HEIGHT - PDF_MARGIN),
+    ]
+    for line in lines:
+        commands.append(pdf_string(line) + b" '")
+    commands.append(b'ET')
+    return b'\n'.join(commands)
+
+
+def export_pdf(rows, user, today):
+    """Пишет PDF постранично, держа в памяти только текущую страницу.
+
+    Объекты 1 (каталог) и 2 (дерево страниц) записываются в конце,
+    когда известны все страницы, шрифт — сразу под номером 3.
+    """
+    offsets = {}
+    position = 0
+
+    def write_object(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position += len(header)
+    yield header
+    yield write_object(3, (
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+        b'/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+        b'/Differences [' + PDF_CYRILLIC_DIFFERENCES.encode('ascii')
+        + b'] >> >>'
+    ))
+
+    def lines():
+        yield f'Список покупок для: {user.get_full_name()}'
+        yield f'Дата: {today:%Y-%m-%d}'
+        yield ''
+        for row in rows:
+            yield format_line(row)
+        yield ''
+        yield f'Foodgram ({today:%Y})'
+
+    pages = []
+    page_lines = []
+    next_number = 4
+
+    def write_page():
+        nonlocal next_number
+        content = pdf_page_content(page_lines)
+        content_number, page_number = next_number, next_number + 1
+        next_number += 2
+        pages.append(page_number)
+        return write_object(
+            content_number,
+            b'<< /Length %d >>\nstream\n' % len(content)
+            + content + b'\nendstream'
+        ) + write_object(page_number, (
+            b'<< /Type /Page /Parent 2 0 R '
+            b'/MediaBox [0 0 %d %d] ' % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT)
+            + b'/Resources << /Font << /F1 3 0 R >> >> '
+            b'/Contents %d 0 R >>' % content_number
+        ))
+
+    for line in lines():
+        page_lines.append(line)
+        if len(page_lines) == PDF_LINES_PER_PAGE:
+            yield write_page()
+            page_lines = []
+    if page_lines or not pages:
+        yield write_page()
+
+    kids = b' '.join(b'%d 0 R' % number for number in pages)
+    yield write_object(
+        2,
+        b'<< /Type /Pages /Kids [' + kids + b'] /Count %d >>' % len(pages)
+    )
+    yield write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    xref = [b'xref', b'0 %d' % next_number, b'0000000000 65535 f ']
+    xref.extend(
+        b'%010d 00000 n ' % offsets[number]
+        for number in range(1, next_number)
+    )
+    yield b'\n'.join(xref) + (
+        b'\ntrailer\n<< /Size %d /Root 1 0 R >>\n'
+        b'startxref\n%d\n%%%%EOF\n' % (next_number, position)
+    )
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+    'pdf': export_pdf,
+}
@@ -1,10 +1,19 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django_filters.rest_framework import FilterSet, filters
 
+from recipes.indexes import recipe_ingredient_index
 from recipes.models import Ingredient, Recipe, Tag
 
 User = get_user_model()
 
+# Каждому порядку соответствует индекс рецептов.
+ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    '-created': ('-created', '-id'),
+    'cooking_time': ('cooking_time', 'id'),
+}
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(
@@ -24,6 +33,20 @@ class RecipeFilter(FilterSet):
         queryset=Tag.objects.all(),
     )
 
+    ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(), method='filter_ingredients'
+    )
+    any_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(), method='filter_ingredients'
+    )
+    exclude_ingredients = filters.ModelMultipleChoiceFilter(
+        queryset=Ingredient.objects.all(), method='filter_ingredients'
+    )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(value, value) for value in ORDERINGS],
+        method='filter_ordering',
+    )
     is_favorited = filters.BooleanFilter(method='filter_is_favorite')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_purchases_list'
@@ -33,6 +56,44 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        data = self.form.cleaned_data
+        all_of, any_of, none_of = (
+            [ingredient.id for ingredient in data.get(name) or ()]
+            for name in (
+                'ingredients', 'any_ingredients', 'exclude_ingredients'
+            )
+        )
+        if not (all_of or any_of or none_of):
+            return queryset
+        if settings.RECIPE_INGREDIENT_INDEX_ENABLED:
+            return self.filter_by_index(queryset, all_of, any_of, none_of)
+        return queryset.with_ingredients(all_of, any_of, none_of)
+
+    def filter_by_index(self, queryset, all_of, any_of, none_of):
+        """Множества пересекаются в памяти, в SQL уходят только id."""
+        limit = settings.RECIPE_INGREDIENT_INDEX_MAX_IDS
+        if all_of or any_of:
+            ids = recipe_ingredient_index.match(all_of, any_of, none_of)
+            if len(ids) <= limit:
+                return queryset.filter(id__in=ids.tolist())
+        else:
+            excluded = recipe_ingredient_index.excluded(none_of)
+            if len(excluded) <= limit:
+                return queryset.exclude(id__in=excluded)
+        return queryset.with_ingredients(all_of, any_of, none_of)
+
+    def filter_ingredients(self, queryset, name, value):
+        # Условия по ингредиентам применяются вместе в filter_queryset.
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*ORDERINGS[value])
+
     def filter_is_favorite(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
@@ -0,0 +1,77 @@
+"""Кеш представлений рецептов, одинаковых для всех пользователей.
+
+Ключ фрагмента собирается из трёх штампов: поколения (меняется при
+правке тегов и ингредиентов), версии рецепта и версии его автора.
+Правка меняет штамп, и старые фрагменты перестают читаться, а из кеша
+уходят по таймауту. Штамп читается раньше данных, поэтому фрагмент,
+собранный во время правки, ложится под уже устаревший ключ.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = 'recipe_fragments:generation'
+RECIPE_VERSION_KEY = 'recipe_fragments:recipe:{}'
+AUTHOR_VERSION_KEY = 'recipe_fragments:author:{}'
+FRAGMENT_KEY = 'recipe_fragments:{}:{}:{}:{}'
+
+
+def bump_generation():
+    cache.set(GENERATION_KEY, uuid4().hex, None)
+
+
+def bump_recipe_version(recipe_id):
+    cache.set(RECIPE_VERSION_KEY.format(recipe_id), uuid4().hex, None)
+
+
+def bump_author_version(author_id):
+    cache.set(AUTHOR_VERSION_KEY.format(author_id), uuid4().hex, None)
+
+
+def current_versions(keys):
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return versions
+
+
+def cached_fragments(recipes, build):
+    """Фрагменты {id рецепта: фрагмент} для рецептов страницы.
+
+    Попадания читаются одним get_many, промахи строит build(ids)
+    и кладёт в кеш одним set_many.
+    """
+    versions = current_versions([GENERATION_KEY] + [
+        key
+        for recipe in recipes
+        for key in (
+            RECIPE_VERSION_KEY.format(recipe.id),
+            AUTHOR_VERSION_KEY.format(recipe.author_id),
+        )
+    ])
+    keys = {
+        recipe.id: FRAGMENT_KEY.format(
+            versions[GENERATION_KEY], recipe.id,
+            versions[RECIPE_VERSION_KEY.format(recipe.id)],
+            versions[AUTHOR_VERSION_KEY.format(recipe.author_id)],
+        )
+        for recipe in recipes
+    }
+    found = cache.get_many(list(keys.values()))
+    fragments = {
+        recipe_id: found[key]
+        for recipe_id, key in keys.items() if key in found
+    }
+    missing = [recipe_id for recipe_id in keys if recipe_id not in fragments]
+    if missing:
+        built = build(missing)
+        cache.set_many(
+            {keys[recipe_id]: built[recipe_id] for recipe_id in built},
+            settings.RECIPE_FRAGMENT_CACHE_TIMEOUT,
+        )
+        fragments.update(built)
+    return fragments
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe
+from users.models import User
+
+from .bench_endpoints import percentile
+
+# Горячие пути чтения: name, path, authenticated.
+PATHS = (
+    ('recipes-list', '/api/recipes/', False),
+    ('recipes-detail', '/api/recipes/{recipe}/', False),
+    ('ingredients-search', '/api/ingredients/?name={prefix}', False),
+    ('tags-list', '/api/tags/', False),
+    ('subscriptions', '/api/users/subscriptions/?recipes_limit=3', True),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load api read paths from concurrent clients in-process and compare '
+        'a single-threaded worker with gthread pools'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=25,
+                            help='Requests per client')
+        parser.add_argument('--threads', type=int, nargs='+',
+                            default=[1, 4, 8],
+                            help='Worker threads, 1 is a sync worker')
+
+    def build_paths(self):
+        context = {
+            'recipe': Recipe.objects.order_by('-id').values_list(
+                'id', flat=True
+            ).first(),
+            'prefix': Ingredient.objects.order_by('id').values_list(
+                'name', flat=True
+            ).first(),
+        }
+        user = User.objects.filter(follower__isnull=False).first()
+        if None in context.values() or user is None:
+            raise CommandError('Not enough data, run generate_data!')
+        context['prefix'] = context['prefix'][:2]
+        return user, [
+            (path.format(**context), authenticated)
+            for _, path, authenticated in PATHS
+        ]
+
+    def client_loop(self, user, paths, count, slots, timings, errors):
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].force_authenticate(user)
+        try:
+            for number in range(count):
+                path, authenticated = paths[number % len(paths)]
+                started = time.perf_counter()
+                # Запрос ждёт свободный поток воркера, как в очереди
+                # gunicorn: это время входит в задержку.
+                with slots:
+                    response = clients[authenticated].get(path)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(f'{path}: {response.status_code}')
+        finally:
+            connection.close()
+
+    def run(self, user, paths, threads, options):
+        slots = threading.Semaphore(threads)
+        timings = []
+        errors = []
+        clients = [
+            threading.Thread(target=self.client_loop, args=(
+                user, paths[number:] + paths[:number], options['requests'],
+                slots, timings, errors,
+            ))
+            for number in range(options['clients'])
+        ]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise CommandError('\n'.join(errors[:10]))
+        timings = [timing * 1000 for timing in timings]
+        return (
+            len(timings) / elapsed,
+            percentile(timings, 0.5),
+            percentile(timings, 0.99),
+        )
+
+    def handle(self, *args, **options):
+        user, paths = self.build_paths()
+        self.stdout.write(
+            f'{options["clients"]} clients x {options["requests"]} requests'
+        )
+        self.stdout.write(
+            f'{"threads":>8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}'
+        )
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'], RECIPE_RESPONSE_CACHE_TIMEOUT=0
+        ):
+            for threads in options['threads']:
+                throughput, p50, p99 = self.run(user, paths, threads, options)
+                self.stdout.write(
+                    f'{threads:>8}{throughput:>10.1f}{p50:>10.2f}{p99:>10.2f}'
+                )
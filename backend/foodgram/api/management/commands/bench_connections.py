@@ -0,0 +1,91 @@
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import User
+
+from .bench_endpoints import percentile
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare requests per second of short write endpoints with '
+        'per-request and persistent database connections'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--max-age', type=int, default=600,
+                            help='CONN_MAX_AGE of the persistent mode')
+
+    def build_requests(self):
+        user = User.objects.order_by('id').first()
+        recipe = Recipe.objects.exclude(favorites__user=user).exclude(
+            shopping_cart__user=user
+        ).order_by('id').first()
+        if recipe is None:
+            raise CommandError('No recipes in database, run generate_data!')
+        token, _ = Token.objects.get_or_create(user=user)
+        factory = RequestFactory(HTTP_AUTHORIZATION=f'Token {token.key}')
+        # Пары возвращают базу в исходное состояние.
+        return [
+            getattr(factory, method)(
+                f'/api/recipes/{recipe.id}/{action}/'
+            ).environ
+            for action in ('favorite', 'shopping_cart')
+            for method in ('post', 'delete')
+        ]
+
+    def measure(self, handler, environs, iterations, max_age):
+        connection = connections[DEFAULT_DB_ALIAS]
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        timings = []
+        started = time.perf_counter()
+        for number in range(iterations):
+            environ = dict(environs[number % len(environs)])
+            request_started = time.perf_counter()
+            response = handler(environ, lambda status, headers: None)
+            # Как сервер WSGI: close() шлёт request_finished, и Django
+            # закрывает соединение, если его срок вышел.
+            response.close()
+            timings.append((time.perf_counter() - request_started) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{environ["PATH_INFO"]}: {response.status_code}'
+                )
+        elapsed = time.perf_counter() - started
+        connection.close()
+        return (
+            iterations / elapsed,
+            percentile(timings, 0.5),
+            percentile(timings, 0.99),
+        )
+
+    def handle(self, *args, **options):
+        environs = self.build_requests()
+        handler = WSGIHandler()
+        original = connections[DEFAULT_DB_ALIAS].settings_dict['CONN_MAX_AGE']
+        self.stdout.write(
+            f'{"CONN_MAX_AGE":>12}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}'
+        )
+        try:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                for max_age in (0, options['max_age']):
+                    throughput, p50, p99 = self.measure(
+                        handler, environs, options['iterations'], max_age
+                    )
+                    self.stdout.write(
+                        f'{max_age:>12}{throughput:>10.1f}'
+                        f'{p50:>10.2f}{p99:>10.2f}'
+                    )
+        finally:
+            connections[DEFAULT_DB_ALIAS].settings_dict[
+                'CONN_MAX_AGE'
+            ] = original
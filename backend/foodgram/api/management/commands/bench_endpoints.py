@@ -0,0 +1,256 @@
+import base64
+import json
+import math
+import time
+from io import BytesIO
+from pathlib import Path
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+BUDGETS = Path(__file__).resolve().parents[2] / 'bench_budgets.json'
+
+# name, method, path, body, authenticated, expected status.
+# Пары запросов на запись возвращают базу в исходное состояние.
+ENDPOINTS = (
+    ('tags-list', 'get', '/api/tags/', None, False, 200),
+    ('ingredients-search', 'get', '/api/ingredients/?name={prefix}',
+     None, False, 200),
+    ('recipes-list-anonymous', 'get', '/api/recipes/', None, False, 200),
+    ('recipes-list', 'get', '/api/recipes/', None, True, 200),
+    ('recipes-list-tags', 'get', '/api/recipes/?tags={tag}',
+     None, True, 200),
+    ('recipes-list-favorited', 'get', '/api/recipes/?is_favorited=1',
+     None, True, 200),
+    ('recipes-list-shopping-cart', 'get',
+     '/api/recipes/?is_in_shopping_cart=1', None, True, 200),
+    ('recipes-list-cursor', 'get', '/api/recipes/?pagination=cursor',
+     None, True, 200),
+    ('recipes-search', 'get', '/api/recipes/?search={query}',
+     None, True, 200),
+    ('recipes-list-popular', 'get', '/api/recipes/?ordering=popular',
+     None, True, 200),
+    ('recipes-trending', 'get', '/api/recipes/trending/', None, True, 200),
+    ('recipes-feed', 'get', '/api/recipes/feed/', None, True, 200),
+    ('recipes-detail', 'get', '/api/recipes/{recipe}/', None, True, 200),
+    ('recipes-create', 'post', '/api/recipes/', 'recipe', True, 201),
+    ('recipes-update', 'patch', '/api/recipes/{created}/', 'update',
+     True, 200),
+    ('recipes-delete', 'delete', '/api/recipes/{created}/', None, True, 204),
+    ('favorite-add', 'post', '/api/recipes/{favorite}/favorite/',
+     None, True, 201),
+    ('favorite-remove', 'delete', '/api/recipes/{favorite}/favorite/',
+     None, True, 204),
+    ('shopping-cart-add', 'post', '/api/recipes/{cart}/shopping_cart/',
+     None, True, 201),
+    ('shopping-cart-remove', 'delete',
+     '/api/recipes/{cart}/shopping_cart/', None, True, 204),
+    ('download-shopping-cart', 'get', '/api/recipes/download_shopping_cart/',
+     None, True, 200),
+    ('users-list', 'get', '/api/users/', None, True, 200),
+    ('users-detail', 'get', '/api/users/{author}/', None, True, 200),
+    ('users-me', 'get', '/api/users/me/', None, True, 200),
+    ('subscriptions', 'get', '/api/users/subscriptions/?recipes_limit=3',
+     None, True, 200),
+    ('subscribe', 'post', '/api/users/{author}/subscribe/', None, True, 201),
+    ('unsubscribe', 'delete', '/api/users/{author}/subscribe/',
+     None, True, 204),
+)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, math.ceil(len(values) * fraction) - 1)]
+
+
+def small_image():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+class Command(BaseCommand):
+    help = 'Benchmark api endpoints: latency percentiles and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', help='Email of the benchmark user')
+        parser.add_argument('--only', nargs='+', metavar='NAME')
+        parser.add_argument('--budgets', default=str(BUDGETS))
+        parser.add_argument(
+            '--no-budgets', action='store_true',
+            help='Only report, never fail',
+        )
+        parser.add_argument('--output', help='Write results as json')
+
+    def get_user(self, email):
+        if email:
+            return User.objects.get(email=email)
+        user = User.objects.annotate(
+            carts=Count('shopping_cart', distinct=True),
+            follows=Count('follower', distinct=True),
+        ).filter(carts__gt=0, follows__gt=0).order_by('-carts').first()
+        if user is None:
+            raise CommandError(
+                'Need a user with a shopping cart and subscriptions, '
+                'run generate_data!'
+            )
+        return user
+
+    def build_context(self, user):
+        """Объекты для запросов: на запись берутся ещё не связанные."""
+        recipes = Recipe.objects.order_by('id').values_list('id', flat=True)
+        authors = User.objects.filter(recipes__isnull=False).exclude(
+            following__user=user
+        ).exclude(pk=user.pk).order_by('id')
+        context = {
+            'prefix': Ingredient.objects.order_by('id').first().name[:2],
+            'tag': Tag.objects.order_by('id').first().slug,
+            'recipe': recipes.annotate(
+                popularity=Count('favorites')
+            ).order_by('-popularity', 'id').first(),
+            'favorite': recipes.exclude(favorites__user=user).first(),
+            'cart': recipes.exclude(shopping_cart__user=user).first(),
+            'author': authors.values_list('id', flat=True).first(),
+        }
+        context['query'] = Recipe.objects.filter(
+            pk=context['recipe']
+        ).values_list('name', flat=True).first()
+        if None in context.values():
+            raise CommandError(f'Not enough data for benchmark: {context}')
+        ingredients = list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True
+        )[:6])
+        tags = list(Tag.objects.order_by('id').values_list(
+            'id', flat=True
+        )[:2])
+        recipe = {
+            'name': 'Benchmark',
+            'text': 'Benchmark recipe',
+            'cooking_time': 10,
+            'image': small_image(),
+            'tags': tags,
+            'ingredients': [
+                {'id': ingredient, 'amount': 10} for ingredient in ingredients
+            ],
+        }
+        bodies = {
+            'recipe': recipe,
+            'update': dict(
+                recipe,
+                tags=tags[:1],
+                ingredients=recipe['ingredients'][1:] + [
+                    {'id': ingredients[0], 'amount': 20}
+                ],
+            ),
+        }
+        return context, bodies
+
+    def request(self, client, method, path, body):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, body, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        return response, elapsed, len(queries)
+
+    def run_once(self, clients, endpoints, context, bodies, results):
+        for name, method, path, body, authenticated, expected in endpoints:
+            response, elapsed, queries = self.request(
+                clients[authenticated], method, path.format(**context),
+                bodies.get(body),
+            )
+            if response.status_code != expected:
+                raise CommandError(
+                    f'{name}: expected {expected}, got '
+                    f'{response.status_code} {response.content[:200]}'
+                )
+            if name == 'recipes-create':
+                context['created'] = response.data['id']
+                context['image'] = Recipe.objects.get(
+                    pk=context['created']
+                ).image
+            if name == 'recipes-delete':
+                context['image'].storage.delete(context['image'].name)
+            if results is not None:
+                results[name]['timings'].append(elapsed)
+                results[name]['queries'].append(queries)
+
+    def summarize(self, results):
+        summary = {}
+        for name, result in results.items():
+            timings = [timing * 1000 for timing in result['timings']]
+            summary[name] = {
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'queries': max(result['queries']),
+            }
+        return summary
+
+    def check_budgets(self, summary, path):
+        with open(path, encoding='utf-8') as budgets_file:
+            budgets = json.load(budgets_file)
+        failures = []
+        for name, measured in summary.items():
+            if name not in budgets:
+                failures.append(f'{name}: no budget')
+                continue
+            for metric, limit in budgets[name].items():
+                if measured[metric] > limit:
+                    failures.append(
+                        f'{name}: {metric} {measured[metric]} > {limit}'
+                    )
+        return failures
+
+    def handle(self, *args, **options):
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['only'] or endpoint[0] in options['only']
+        ]
+        user = self.get_user(options['user'])
+        context, bodies = self.build_context(user)
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].force_authenticate(user)
+        results = {
+            endpoint[0]: {'timings': [], 'queries': []}
+            for endpoint in endpoints
+        }
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for _ in range(options['warmup']):
+                self.run_once(clients, endpoints, context, bodies, None)
+            for _ in range(options['iterations']):
+                self.run_once(clients, endpoints, context, bodies, results)
+        summary = self.summarize(results)
+        self.stdout.write(
+            f'{"endpoint":<28}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+            f'{"queries":>9}'
+        )
+        for name, measured in summary.items():
+            self.stdout.write(
+                f'{name:<28}{measured["p50_ms"]:>9.2f}'
+                f'{measured["p95_ms"]:>9.2f}{measured["p99_ms"]:>9.2f}'
+                f'{measured["queries"]:>9}'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(summary, output, indent=2)
+        if options['no_budgets']:
+            return
+        failures = self.check_budgets(summary, options['budgets'])
+        if failures:
+            raise CommandError(
+                'Budgets exceeded:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
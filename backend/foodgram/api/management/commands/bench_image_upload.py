@@ -0,0 +1,111 @@
+import base64
+import json
+import os
+import resource
+import time
+import tracemalloc
+from io import BytesIO
+from multiprocessing import get_context
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def noise_png(size):
+    """PNG из шума: почти не сжимается, поэтому размер близок к size."""
+    side = int((size / 3) ** 0.5)
+    buffer = BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        buffer, format='PNG', compress_level=0
+    )
+    return buffer.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare base64 JSON and multipart recipe image uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=float, default=10)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def build_requests(self, image):
+        user = User.objects.first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        if not (user and tag and ingredient):
+            raise CommandError('Need at least one user, tag and ingredient!')
+        fields = {
+            'name': 'Benchmark',
+            'text': 'Benchmark',
+            'cooking_time': 1,
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 1}],
+        }
+        encoded = base64.b64encode(image).decode()
+        json_body = json.dumps(
+            dict(fields, image=f'data:image/png;base64,{encoded}')
+        ).encode()
+        image_file = BytesIO(image)
+        image_file.name = 'benchmark.png'
+        multipart_body = encode_multipart(
+            BOUNDARY, {'data': json.dumps(fields), 'image': image_file}
+        )
+        return user, {
+            'json': (json_body, 'application/json'),
+            'multipart': (multipart_body, MULTIPART_CONTENT),
+        }
+
+    def measure(self, user, body, content_type, queue):
+        client = APIClient()
+        client.force_authenticate(user)
+        tracemalloc.start()
+        started = time.perf_counter()
+        with transaction.atomic():
+            response = client.generic(
+                'POST', '/api/recipes/', body, content_type=content_type
+            )
+            elapsed = time.perf_counter() - started
+            if response.status_code == 201:
+                Recipe.objects.get(pk=response.data['id']).image.delete(
+                    save=False
+                )
+            transaction.set_rollback(True)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        queue.put((
+            response.status_code,
+            elapsed,
+            peak,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        ))
+
+    def handle(self, *args, **options):
+        image = noise_png(int(options['size_mb'] * 1024 * 1024))
+        user, requests = self.build_requests(image)
+        self.stdout.write(f'Image size: {len(image) / 1024 / 1024:.1f} MB')
+        context = get_context('fork')
+        connections.close_all()
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for title, (body, content_type) in requests.items():
+                for attempt in range(options['repeat']):
+                    queue = context.Queue()
+                    worker = context.Process(
+                        target=self.measure,
+                        args=(user, body, content_type, queue),
+                    )
+                    worker.start()
+                    status, elapsed, peak, max_rss = queue.get()
+                    worker.join()
+                    self.stdout.write(
+                        f'{title:>9}: status {status}, '
+                        f'{elapsed * 1000:8.1f} ms, '
+                        f'python peak {peak / 1024 / 1024:7.1f} MB, '
+                        f'max RSS {max_rss / 1024:7.1f} MB'
+                    )
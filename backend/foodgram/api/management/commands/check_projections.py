@@ -0,0 +1,143 @@
+import json
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.renderers import FastJSONRenderer
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+from .bench_endpoints import percentile
+
+# path, authenticated.
+REQUESTS = (
+    ('/api/recipes/', False),
+    ('/api/recipes/', True),
+    ('/api/recipes/?page=2&limit=20', True),
+    ('/api/recipes/?tags={tag}&limit=50', True),
+    ('/api/recipes/?is_favorited=1', True),
+    ('/api/recipes/?is_in_shopping_cart=1', True),
+    ('/api/recipes/?author={author}', True),
+    ('/api/recipes/?ordering=popular&limit=30', False),
+    ('/api/recipes/?pagination=cursor&limit=30', True),
+    ('/api/recipes/trending/?limit=20', True),
+    ('/api/recipes/feed/?limit=20', True),
+    ('/api/ingredients/', False),
+    ('/api/ingredients/?name={prefix}', False),
+    ('/api/users/subscriptions/', True),
+    ('/api/users/subscriptions/?recipes_limit=3', True),
+    ('/api/users/subscriptions/?recipes_limit=1&limit=2&page=2', True),
+)
+# Строки, на которых могли бы разойтись json.dumps и orjson.
+RENDER_SAMPLES = (
+    {'text': 'Строка\u2028с разделителями\u2029и "кавычками" \\ </script>'},
+    [1, -2, 2 ** 53, True, None, '', 'ё😀'],
+)
+# Степень у float orjson пишет короче (1e-7 вместо 1e-07),
+# поэтому числа сравниваются по значению.
+FLOAT_SAMPLE = [0.1, 1e-7, 1.5e300, -0.0]
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that values()-based list responses are byte-identical '
+        'to serializer output and compare their latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Email of the checked user')
+        parser.add_argument('--iterations', type=int, default=10)
+
+    def get_user(self, email):
+        if email:
+            return User.objects.get(email=email)
+        user = User.objects.annotate(
+            follows=Count('follower', distinct=True),
+        ).filter(
+            follows__gt=2, favorites__isnull=False,
+            shopping_cart__isnull=False,
+        ).order_by('-follows').first()
+        if user is None:
+            raise CommandError('Not enough data, run generate_data!')
+        return user
+
+    def build_paths(self, user):
+        context = {
+            'tag': Tag.objects.order_by('id').values_list(
+                'slug', flat=True
+            ).first(),
+            'author': Recipe.objects.order_by('id').values_list(
+                'author_id', flat=True
+            ).first(),
+            'prefix': Ingredient.objects.order_by('id').values_list(
+                'name', flat=True
+            ).first()[:2],
+        }
+        return [
+            (path.format(**context), authenticated)
+            for path, authenticated in REQUESTS
+        ]
+
+    def fetch(self, clients, path, authenticated, projected):
+        with override_settings(API_PROJECTIONS_ENABLED=projected):
+            started = time.perf_counter()
+            response = clients[authenticated].get(path)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{path}: {response.status_code}')
+        return response.content, elapsed
+
+    def check_renderer(self):
+        for sample in RENDER_SAMPLES:
+            expected = JSONRenderer().render(sample)
+            rendered = FastJSONRenderer().render(sample)
+            if rendered != expected:
+                return f'renderer: {rendered!r} != {expected!r}'
+        if json.loads(FastJSONRenderer().render(FLOAT_SAMPLE)) != FLOAT_SAMPLE:
+            return 'renderer: floats differ'
+        return None
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        clients = {False: APIClient(), True: APIClient()}
+        clients[True].force_authenticate(user)
+        failures = []
+        renderer_failure = self.check_renderer()
+        if renderer_failure:
+            failures.append(renderer_failure)
+        self.stdout.write(
+            f'{"request":<58}{"serializer":>13}{"values":>11}'
+        )
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            RECIPE_RESPONSE_CACHE_TIMEOUT=0,
+            INGREDIENT_INDEX_ENABLED=False,
+        ):
+            for path, authenticated in self.build_paths(user):
+                timings = {False: [], True: []}
+                for _ in range(options['iterations']):
+                    for projected in (False, True):
+                        content, elapsed = self.fetch(
+                            clients, path, authenticated, projected
+                        )
+                        timings[projected].append(elapsed * 1000)
+                        if projected:
+                            projected_content = content
+                        else:
+                            expected = content
+                if projected_content != expected:
+                    failures.append(path)
+                title = f'{path}{" (user)" if authenticated else ""}'
+                self.stdout.write(
+                    f'{title:<58}{percentile(timings[False], 0.5):>11.2f}ms'
+                    f'{percentile(timings[True], 0.5):>9.2f}ms'
+                )
+        if failures:
+            raise CommandError(
+                'Projections differ from serializers:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('All responses are identical'))
@@ -1,6 +1,154 @@
-from rest_framework.pagination import PageNumberPagination
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from recipes import feed
+from recipes.models import Recipe
+
+from .filters import ORDERINGS
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу порядка из ORDERINGS без COUNT(*) и OFFSET.
+
+    Включается параметром pagination=cursor, следующая страница
+    запрашивается по ссылке next с параметром cursor. Курсор хранит
+    имя порядка и значения ключа, например (-created, -id). С поиском
+    не сочетается: ранг вычисляется на лету, и ключа по нему нет.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    search_query_param = 'search'
+    ordering_query_param = 'ordering'
+    default_ordering = '-created'
+    page_size_query_param = 'limit'
+    page_size = 6
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор.'
+    search_message = (
+        'Результаты поиска листаются только по номерам страниц.'
+    )
+
+    @classmethod
+    def is_requested(cls, request):
+        return (cls.cursor_query_param in request.query_params
+                or request.query_params.get(cls.mode_query_param) == 'cursor')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get(self.ordering_query_param)
+        return ordering if ordering in ORDERINGS else self.default_ordering
+
+    def key_field(self, request):
+        return ORDERINGS[self.get_ordering(request)][0].lstrip('-')
+
+    def decode_cursor(self, request):
+        """Позиция курсора: (значение первого поля ключа, id)."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            ordering, value, pk = b64decode(
+                encoded.encode('ascii'), altchars=b'-_', validate=True
+            ).decode('ascii').split('|')
+            value = Recipe._meta.get_field(
+                self.key_field(request)
+            ).to_python(value)
+            pk = int(pk)
+        except (BinasciiError, UnicodeError, ValueError,
+                DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None or ordering != self.get_ordering(request):
+            raise NotFound(self.invalid_cursor_message)
+        return value, pk
+
+    def encode_cursor(self, instance):
+        value = Recipe._meta.get_field(
+            self.key_field(self.request)
+        ).value_to_string(instance)
+        position = f'{self.get_ordering(self.request)}|{value}|{instance.pk}'
+        return b64encode(
+            position.encode('ascii'), altchars=b'-_'
+        ).decode('ascii')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if request.query_params.get(self.search_query_param):
+            raise ValidationError({self.mode_query_param: [
+                self.search_message
+            ]})
+        page_size = self.get_page_size(request)
+        key = ORDERINGS[self.get_ordering(request)]
+        queryset = queryset.order_by(*key)
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            (field, field_op), (_, id_op) = (
+                (name.lstrip('-'), 'lt' if name.startswith('-') else 'gt')
+                for name in key
+            )
+            queryset = queryset.filter(
+                Q(**{f'{field}__{field_op}': value})
+                | Q(**{field: value, f'id__{id_op}': pk})
+            )
+        results = list(queryset[:page_size + 1])
+        self.page = results[:page_size]
+        self.has_next = len(results) > page_size
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.page[-1]),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты подписок.
+
+    Порядок и позиции берутся из recipes.feed, из базы загружается
+    только сама страница рецептов.
+    """
+
+    def get_ordering(self, request):
+        return self.default_ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        ids = feed.page_ids(
+            request.user, self.decode_cursor(request), page_size + 1
+        )
+        recipes = queryset.in_bulk(ids[:page_size])
+        self.page = [recipes[pk] for pk in ids[:page_size] if pk in recipes]
+        self.has_next = len(ids) > page_size
+        return self.page
@@ -0,0 +1,43 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """multipart/form-data с вложенными полями в JSON.
+
+    Поля рецепта можно передать одной JSON-частью data, а вложенные
+    ingredients и tags — отдельными частями с JSON. Файлы разбираются
+    обработчиками загрузки Django и большие пишутся во временный файл.
+    Данные и файлы возвращаются обычными словарями: Request объединяет
+    их через dict.update, а MultiValueDict отдал бы списки значений.
+    """
+    json_part = 'data'
+    json_fields = ('ingredients', 'tags')
+
+    def load_json(self, value):
+        try:
+            return json.loads(value)
+        except ValueError as error:
+            raise ParseError(f'JSON parse error - {error}')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in parsed.data.lists():
+            if key == self.json_part:
+                payload = self.load_json(values[-1])
+                if not isinstance(payload, dict):
+                    raise ParseError(
+                        f'JSON parse error - {key} must be an object'
+                    )
+                data.update(payload)
+            elif key in self.json_fields and len(values) == 1:
+                data[key] = self.load_json(values[0])
+            elif key in self.json_fields:
+                data[key] = values
+            else:
+                data[key] = values[-1]
+        files = {key: parsed.files[key] for key in parsed.files}
+        return DataAndFiles(data, files)
@@ -0,0 +1,187 @@
+"""Ответы списков, собранные из values_list() без сериализаторов.
+
+Каждая функция повторяет вывод своего сериализатора поле в поле:
+RecipeReadSerializer, IngredientSerializer и FollowSerializer.
+Команда check_projections сверяет оба пути на живых данных.
+"""
+from collections import defaultdict
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from recipes.models import (IngredientInRecipe, Recipe, RecipeImageVariant,
+                            TagRecipe)
+from users.utils import get_followed_author_ids
+
+from .fragments import cached_fragments
+
+USER_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+user_values = attrgetter(*USER_FIELDS)
+# Поля ключей порядков из filters.ORDERINGS: по ним листает курсор.
+PAGE_KEY_FIELDS = ('id', 'created', 'favorites_count', 'cooking_time')
+# Поля рецепта и автора, которые нужны пагинации и представлению.
+RECIPE_PAGE_FIELDS = PAGE_KEY_FIELDS + (
+    'name', 'image', 'text',
+) + tuple(f'author__{field}' for field in USER_FIELDS)
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit')
+
+
+def file_url(model, name):
+    """Адрес файла, как его отдаёт FileField сериализатора без запроса."""
+    if not name:
+        return None
+    return model._meta.get_field('image').storage.url(name)
+
+
+def grouped(rows):
+    """Строки (ключ, *значения) -> {ключ: [значения, ...]}."""
+    groups = defaultdict(list)
+    for key, *values in rows:
+        groups[key].append(values)
+    return groups
+
+
+def recipe_page(queryset):
+    """Выборка для пагинации: рецепты с автором, без prefetch.
+
+    С кешем фрагментов - только ключ страницы, автор и флаги
+    пользователя, остальное читается из кеша.
+    """
+    queryset = queryset.prefetch_related(None)
+    if settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        return queryset.select_related(None).only(
+            *PAGE_KEY_FIELDS, 'author'
+        )
+    return queryset.select_related('author').only(*RECIPE_PAGE_FIELDS)
+
+
+def build_fragments(recipes, using=None):
+    """Части представлений рецептов, общие для всех пользователей.
+
+    Адреса картинок относительные, флаги пользователя - заглушки,
+    которые держат порядок полей RecipeReadSerializer.
+    """
+    ids = [recipe.id for recipe in recipes]
+    tags = grouped(TagRecipe.objects.using(using).filter(
+        recipe_id__in=ids
+    ).values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__color', 'tag__slug'
+    ))
+    ingredients = grouped(IngredientInRecipe.objects.using(using).filter(
+        recipe_id__in=ids
+    ).order_by('ingredient__name').values_list(
+        'recipe_id', 'ingredient_id', 'ingredient__name',
+        'ingredient__measurement_unit', 'amount',
+    ))
+    variants = grouped(RecipeImageVariant.objects.using(using).filter(
+        recipe_id__in=ids
+    ).values_list('recipe_id', 'size', 'image'))
+    return {
+        recipe.id: {
+            'id': recipe.id,
+            'tags': [
+                dict(zip(('id', 'name', 'color', 'slug'), tag))
+                for tag in tags[recipe.id]
+            ],
+            'author': dict(zip(USER_FIELDS, user_values(recipe.author))),
+            'ingredients': [
+                dict(zip(('id', 'name', 'measurement_unit', 'amount'), item))
+                for item in ingredients[recipe.id]
+            ],
+            'is_favorited': None,
+            'is_in_shopping_cart': None,
+            'name': recipe.name,
+            'image': file_url(Recipe, recipe.image.name),
+            'image_variants': {
+                size: file_url(RecipeImageVariant, image)
+                for size, image in variants[recipe.id]
+            },
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+        for recipe in recipes
+    }
+
+
+def load_fragments(recipe_ids):
+    # Из основной базы: фрагмент с отставшей реплики лёг бы
+    # под новую версию.
+    return build_fragments(Recipe.objects.using(DEFAULT_DB_ALIAS).filter(
+        id__in=recipe_ids
+    ).select_related('author').only(*RECIPE_PAGE_FIELDS), DEFAULT_DB_ALIAS)
+
+
+def absolute_url(request, url):
+    return url if url is None else request.build_absolute_uri(url)
+
+
+def recipes(page, request):
+    """Представления рецептов страницы, как у RecipeReadSerializer.
+
+    Рецепты страницы должны нести флаги is_favorited
+    и is_in_shopping_cart из Recipe.objects.with_user_flags().
+    """
+    if settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        fragments = cached_fragments(page, load_fragments)
+    else:
+        fragments = build_fragments(page)
+    followed = get_followed_author_ids(request)
+    return [
+        dict(
+            fragments[recipe.id],
+            author=dict(
+                fragments[recipe.id]['author'],
+                is_subscribed=recipe.author_id in followed,
+            ),
+            is_favorited=recipe.is_favorited,
+            is_in_shopping_cart=recipe.is_in_shopping_cart,
+            image=absolute_url(request, fragments[recipe.id]['image']),
+            image_variants={
+                size: absolute_url(request, url)
+                for size, url in fragments[recipe.id]['image_variants'].items()
+            },
+        )
+        for recipe in page
+    ]
+
+
+def ingredients(queryset):
+    return list(queryset.values(*INGREDIENT_FIELDS))
+
+
+def subscription_page(queryset):
+    return queryset.values_list(*USER_FIELDS, 'recipes_count')
+
+
+def subscriptions(page, recipes_limit=None):
+    """Представления авторов страницы подписок, как у FollowSerializer.
+
+    Картинки рецептов - относительные адреса: FollowSerializer
+    создаёт RecipeShortSerializer без запроса в контексте.
+    """
+    author_ids = [row[1] for row in page]
+    author_recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if recipes_limit is not None:
+        author_recipes = author_recipes.limited_per_author(recipes_limit)
+    short_recipes = grouped(author_recipes.values_list(
+        'author_id', 'id', 'name', 'image', 'cooking_time'
+    ))
+    return [
+        dict(
+            zip(USER_FIELDS, row[:-1]),
+            is_subscribed=True,
+            recipes_count=row[-1],
+            recipes=[
+                {
+                    'id': recipe_id,
+                    'name': name,
+                    'image': file_url(Recipe, image),
+                    'cooking_time': cooking_time,
+                }
+                for recipe_id, name, image, cooking_time
+                in short_recipes[row[1]]
+            ],
+        )
+        for row in page
+    ]
@@ -0,0 +1,28 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же компактным выводом.
+
+    Типы, которых orjson не знает, и даты уходят в JSONEncoder DRF.
+    Ответ с отступами рендерит родительский класс.
+    """
+    options = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(
+            accepted_media_type, renderer_context or {}
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как JSONRenderer: разделители строк JavaScript экранируются.
+        return orjson.dumps(
+            data, default=JSONEncoder().default, option=self.options
+        ).replace(b'\xe2\x80\xa8', b'\\u2028').replace(
+            b'\xe2\x80\xa9', b'\\u2029'
+        )
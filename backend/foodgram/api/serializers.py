@@ -1,18 +1,36 @@
+import os
+from uuid import uuid4
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import UploadedFile
 from django.db import transaction
-from django.db.models import F
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import IntegerField, SerializerMethodField
+from rest_framework.fields import (ImageField, IntegerField,
+                                   SerializerMethodField)
 from rest_framework.relations import PrimaryKeyRelatedField
 from rest_framework.serializers import ModelSerializer
 
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from recipes.indexes import RecipeIngredientIndex
+from recipes.models import (ImageJob, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCartTotal, Tag, TagRecipe)
 from users.serializers import CustomUserSerializer
 
 User = get_user_model()
 
 
+class Base64OrFileImageField(Base64ImageField):
+    """Картинка строкой base64 в JSON или файлом из multipart/form-data."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, UploadedFile):
+            extension = os.path.splitext(data.name)[1].lower()
+            data.name = f'{uuid4()}{extension}'
+            return ImageField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
 class IngredientSerializer(ModelSerializer):
     class Meta:
         model = Ingredient
@@ -26,10 +44,11 @@ class TagSerializer(ModelSerializer):
 
 
 class RecipeReadSerializer(ModelSerializer):
-    tags = TagSerializer(many=True, read_only=True)
+    tags = SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     ingredients = SerializerMethodField()
     image = Base64ImageField()
+    image_variants = SerializerMethodField()
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
 
@@ -44,25 +63,46 @@ class RecipeReadSerializer(ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
 
+    def get_tags(self, obj):
+        return TagSerializer(
+            [tag_recipe.tag for tag_recipe in obj.tag_recipes.all()],
+            many=True
+        ).data
+
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredients_recipes__amount')
-        )
+        return [
+            {
+                'id': item.ingredient.id,
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in obj.ingredients_recipes.all()
+        ]
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        return {
+            variant.size: request.build_absolute_uri(variant.image.url)
+            for variant in obj.image_variants.all()
+        }
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
         return user.favorites.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
@@ -82,7 +122,7 @@ class RecipeWriteSerializer(ModelSerializer):
                                   many=True)
     author = CustomUserSerializer(read_only=True)
     ingredients = IngredientInRecipeWriteSerializer(many=True)
-    image = Base64ImageField()
+    image = Base64OrFileImageField()
 
     class Meta:
         model = Recipe
@@ -139,6 +179,21 @@ class RecipeWriteSerializer(ModelSerializer):
                 amount=ingredient['amount']
             ) for ingredient in ingredients]
         )
+        self.update_ingredient_index(
+            recipe, added=[ingredient['id'] for ingredient in ingredients]
+        )
+
+    def update_ingredient_index(self, recipe, added=(), removed=()):
+        if settings.RECIPE_INGREDIENT_INDEX_ENABLED:
+            transaction.on_commit(
+                lambda: RecipeIngredientIndex.record_change(
+                    recipe.id, added=added, removed=removed
+                )
+            )
+
+    def enqueue_image(self, recipe):
+        if settings.IMAGE_PIPELINE_ENABLED:
+            ImageJob.objects.create(recipe=recipe)
 
     @transaction.atomic
     def create(self, validated_data):
@@ -148,23 +203,87 @@ class RecipeWriteSerializer(ModelSerializer):
         recipe.tags.set(tags)
         self.create_ingredients_amounts(recipe=recipe,
                                         ingredients=ingredients)
+        self.enqueue_image(recipe)
         return recipe
 
+    def update_tags(self, recipe, tags):
+        current = set(recipe.tag_recipes.values_list('tag_id', flat=True))
+        wanted = {tag.id for tag in tags}
+        if current - wanted:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=current - wanted
+            ).delete()
+        if wanted - current:
+            TagRecipe.objects.bulk_create(
+                [TagRecipe(tag_id=tag_id, recipe=recipe)
+                 for tag_id in wanted - current]
+            )
+
+    def update_ingredients_amounts(self, recipe, ingredients):
+        """Сводит ингредиенты рецепта к новому списку.
+
+        Возвращает изменения количеств {ingredient_id: delta}.
+        """
+        existing = {
+            item.ingredient_id: item
+            for item in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        deltas = {}
+        created = []
+        changed = []
+        for ingredient_id, amount in amounts.items():
+            item = existing.get(ingredient_id)
+            if item is None:
+                created.append(IngredientInRecipe(
+                    ingredient_id=ingredient_id, recipe=recipe, amount=amount
+                ))
+                deltas[ingredient_id] = amount
+            elif item.amount != amount:
+                deltas[ingredient_id] = amount - item.amount
+                item.amount = amount
+                changed.append(item)
+        removed = existing.keys() - amounts.keys()
+        for ingredient_id in removed:
+            deltas[ingredient_id] = -existing[ingredient_id].amount
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ['amount'])
+        if created:
+            IngredientInRecipe.objects.bulk_create(created)
+        if created or removed:
+            self.update_ingredient_index(
+                recipe,
+                added=[item.ingredient_id for item in created],
+                removed=list(removed),
+            )
+        return deltas
+
     @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients_amounts(recipe=instance,
-                                        ingredients=ingredients)
+        if 'image' in validated_data:
+            self.enqueue_image(instance)
+        self.update_tags(instance, tags)
+        deltas = self.update_ingredients_amounts(instance, ingredients)
+        if deltas:
+            ShoppingCartTotal.objects.apply_deltas(
+                instance.shopping_cart.values_list('user_id', flat=True),
+                deltas
+            )
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.with_related().with_user_flags(
+            request.user
+        ).get(pk=instance.pk)
         return RecipeReadSerializer(
             instance,
             context=context
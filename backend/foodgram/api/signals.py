@@ -0,0 +1,68 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            RecipeImageVariant, Tag, TagRecipe)
+from recipes.signals import recipe_changed
+from users.models import User
+
+from . import fragments
+from .caching import bump_generation
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=TagRecipe)
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+@receiver([post_save, post_delete], sender=RecipeImageVariant)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver([post_save, post_delete], sender=User)
+@receiver(recipe_changed)
+def recipe_content_changed(sender, update_fields=None, **kwargs):
+    if not settings.RECIPE_RESPONSE_CACHE_TIMEOUT:
+        return
+    # Вход пользователя обновляет только last_login.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(bump_generation)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver(recipe_changed)
+def recipe_fragment_changed(sender, instance, **kwargs):
+    if settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        transaction.on_commit(
+            partial(fragments.bump_recipe_version, instance.id)
+        )
+
+
+@receiver([post_save, post_delete], sender=TagRecipe)
+@receiver([post_save, post_delete], sender=IngredientInRecipe)
+@receiver([post_save, post_delete], sender=RecipeImageVariant)
+def recipe_part_changed(sender, instance, **kwargs):
+    if settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        transaction.on_commit(
+            partial(fragments.bump_recipe_version, instance.recipe_id)
+        )
+
+
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+def shared_part_changed(sender, **kwargs):
+    if settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        transaction.on_commit(fragments.bump_generation)
+
+
+@receiver([post_save, post_delete], sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    if not settings.RECIPE_FRAGMENT_CACHE_TIMEOUT:
+        return
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(
+        partial(fragments.bump_author_version, instance.id)
+    )
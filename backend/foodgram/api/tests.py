@@ -0,0 +1,719 @@
+from io import StringIO
+from urllib.parse import quote
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.admin import (FavouriteAdmin, IngredientInRecipeAdmin,
+                           ShoppingCartAdmin)
+from recipes.models import (Favourite, FeedEntry, Ingredient,
+                            IngredientInRecipe, Recipe, ShoppingCart,
+                            ShoppingCartTotal, Tag, TagRecipe)
+from recipes.signals import recipe_changed
+from users.admin import FollowAdmin
+from users.models import Follow, User
+from users.utils import FOLLOWED_AUTHORS_KEY
+
+from .exports import shopping_list_etag
+from .filters import ORDERINGS
+from .serializers import RecipeWriteSerializer
+
+RECIPES_COUNT = 60
+# path, authenticated.
+PROJECTED_REQUESTS = (
+    ('/api/recipes/', False),
+    ('/api/recipes/', True),
+    ('/api/recipes/?page=2&limit=20', True),
+    ('/api/recipes/?tags=tag1', True),
+    ('/api/recipes/?is_favorited=1', True),
+    ('/api/recipes/?is_in_shopping_cart=1', True),
+    ('/api/recipes/?pagination=cursor&limit=10', True),
+    ('/api/ingredients/', False),
+    (f'/api/ingredients/?name={quote("Ингредиент 1")}', False),
+    ('/api/users/subscriptions/', True),
+    ('/api/users/subscriptions/?recipes_limit=0', True),
+    ('/api/users/subscriptions/?recipes_limit=2', True),
+    ('/api/users/subscriptions/?recipes_limit=1&limit=1&page=2', True),
+)
+
+
+def create_recipe(author, tags, amounts, name='Рецепт'):
+    """Рецепт с тегами и ингредиентами {ingredient: amount}."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, image='recipes/test.png',
+        text='Описание', cooking_time=10,
+    )
+    recipe.tags.set(tags)
+    IngredientInRecipe.objects.bulk_create([
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in amounts.items()
+    ])
+    return recipe
+
+
+def run_on_commit():
+    """TestCase не коммитит: колбэки on_commit запускаются вручную."""
+    callbacks = connection.run_on_commit
+    connection.run_on_commit = []
+    for _, callback in callbacks:
+        callback()
+
+
+@override_settings(
+    RECIPE_RESPONSE_CACHE_TIMEOUT=0,
+    FOLLOWED_AUTHORS_CACHE_TIMEOUT=0,
+    RECIPE_FRAGMENT_CACHE_TIMEOUT=0,
+    INGREDIENT_INDEX_ENABLED=False,
+    RECIPE_INGREDIENT_INDEX_ENABLED=False,
+)
+class ListResponseTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='reader@example.com', username='reader',
+            first_name='Читатель', last_name='Тестовый',
+        )
+        authors = [
+            User.objects.create(
+                email=f'author{number}@example.com',
+                username=f'author{number}',
+                first_name=f'Автор {number}', last_name='Тестовый',
+            )
+            for number in range(3)
+        ]
+        Tag.objects.bulk_create([
+            Tag(name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}')
+            for number in range(3)
+        ])
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ])
+        Recipe.objects.bulk_create([
+            Recipe(
+                author=authors[number % len(authors)],
+                name=f'Рецепт {number}',
+                image=f'recipes/{number}.png',
+                text='Описание',
+                cooking_time=number + 1,
+            )
+            for number in range(RECIPES_COUNT)
+        ])
+        # SQLite не возвращает id из bulk_create.
+        tags = list(Tag.objects.order_by('id'))
+        ingredients = list(Ingredient.objects.order_by('id'))
+        recipes = list(Recipe.objects.order_by('id'))
+        TagRecipe.objects.bulk_create([
+            TagRecipe(recipe=recipe, tag=tags[number % len(tags)])
+            for number, recipe in enumerate(recipes)
+        ])
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(
+                recipe=recipe, ingredient=ingredient, amount=number + 1
+            )
+            for number, recipe in enumerate(recipes)
+            for ingredient in ingredients[number % 3:number % 3 + 2]
+        ])
+        Favourite.objects.bulk_create([
+            Favourite(user=cls.user, recipe=recipe)
+            for recipe in recipes[::4]
+        ])
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=cls.user, recipe=recipe)
+            for recipe in recipes[::5]
+        ])
+        Follow.objects.bulk_create([
+            Follow(user=cls.user, author=author) for author in authors[:2]
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for projected in (False, True):
+            with self.subTest(projected=projected), override_settings(
+                API_PROJECTIONS_ENABLED=projected
+            ):
+                expected = self.count_queries('/api/recipes/?limit=6')
+                with self.assertNumQueries(expected):
+                    self.client.get('/api/recipes/?limit=50')
+
+    def assert_projections_match_serializers(self):
+        clients = {False: APIClient(), True: self.client}
+        for path, authenticated in PROJECTED_REQUESTS:
+            with self.subTest(path=path, authenticated=authenticated):
+                responses = []
+                for projected in (False, True):
+                    with override_settings(API_PROJECTIONS_ENABLED=projected):
+                        response = clients[authenticated].get(path)
+                    self.assertEqual(response.status_code, 200)
+                    responses.append(response.content)
+                self.assertEqual(responses[1], responses[0])
+
+    def test_projections_match_serializers(self):
+        self.assert_projections_match_serializers()
+
+    @override_settings(RECIPE_FRAGMENT_CACHE_TIMEOUT=300)
+    def test_cached_fragments_match_serializers(self):
+        # Фрагменты прошлых тестов лежат под теми же id рецептов.
+        cache.clear()
+        # Второй проход читает фрагменты из кеша.
+        self.assert_projections_match_serializers()
+        self.assert_projections_match_serializers()
+        recipe = Recipe.objects.order_by('-created', '-id').first()
+        recipe.name = 'Новое название'
+        recipe.save()
+        run_on_commit()
+        self.assert_projections_match_serializers()
+        # Так картинку меняет обработчик изображений.
+        Recipe.objects.filter(id=recipe.id).update(image='recipes/new.jpg')
+        recipe_changed.send(sender=Recipe, instance=recipe)
+        run_on_commit()
+        self.assert_projections_match_serializers()
+
+    def test_search_is_ranked_and_rejects_cursor(self):
+        response = self.client.get(
+            f'/api/recipes/?search={quote("Рецепт 7")}&limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        names = [recipe['name'] for recipe in response.json()['results']]
+        self.assertEqual(names[0], 'Рецепт 7')
+        for path in (
+            f'/api/recipes/?search={quote("Рецепт")}&pagination=cursor',
+            f'/api/recipes/?search={quote("Рецепт")}&cursor=abc',
+        ):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('pagination', response.json())
+
+    def test_cursor_follows_ordering(self):
+        recipes = list(Recipe.objects.order_by('id'))
+        for number, recipe in enumerate(recipes):
+            # Повторы значений проверяют разбор ничьих по id.
+            Recipe.objects.filter(id=recipe.id).update(
+                favorites_count=number % 3
+            )
+        for ordering, key in ORDERINGS.items():
+            with self.subTest(ordering=ordering):
+                ids = []
+                path = (f'/api/recipes/?ordering={ordering}'
+                        '&pagination=cursor&limit=4')
+                while path:
+                    response = self.client.get(path)
+                    self.assertEqual(response.status_code, 200)
+                    ids += [
+                        recipe['id'] for recipe in response.json()['results']
+                    ]
+                    path = response.json()['next']
+                self.assertEqual(ids, list(Recipe.objects.order_by(
+                    *key
+                ).values_list('id', flat=True)))
+
+    def test_zero_recipes_limit(self):
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=0'
+        )
+        authors = response.json()['results']
+        self.assertTrue(authors)
+        for author in authors:
+            self.assertEqual(author['recipes'], [])
+
+
+class ShoppingListETagTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(3)
+        ]
+        cls.users = [
+            User.objects.create(
+                email=f'buyer{number}@example.com',
+                username=f'buyer{number}',
+                first_name='Покупатель', last_name='Тестовый',
+            )
+            for number in range(2)
+        ]
+        # При id подряд у корзин совпадают число строк, сумма
+        # и сумма amount * ingredient_id.
+        for user, amounts in zip(cls.users, ((1, 2, 0), (2, 0, 1))):
+            ShoppingCartTotal.objects.bulk_create([
+                ShoppingCartTotal(
+                    user=user, ingredient=ingredient, amount=amount
+                )
+                for ingredient, amount in zip(cls.ingredients, amounts)
+                if amount
+            ])
+
+    def etag(self, user):
+        return shopping_list_etag(user, 'txt', timezone.now())
+
+    def test_different_carts_have_different_etags(self):
+        self.assertNotEqual(self.etag(self.users[0]), self.etag(self.users[1]))
+
+    def test_ingredient_rename_changes_etag(self):
+        before = self.etag(self.users[0])
+        Ingredient.objects.filter(id=self.ingredients[0].id).update(
+            name='Новое имя'
+        )
+        self.assertNotEqual(self.etag(self.users[0]), before)
+
+
+class ShoppingCartTotalTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Тестовый',
+        )
+        cls.buyers = [
+            User.objects.create(
+                email=f'buyer{number}@example.com',
+                username=f'buyer{number}',
+                first_name='Покупатель', last_name='Тестовый',
+            )
+            for number in range(2)
+        ]
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        first, second, third, _ = cls.ingredients
+        cls.recipes = [
+            create_recipe(cls.author, [cls.tag], {first: 100, second: 2}),
+            create_recipe(cls.author, [cls.tag], {second: 3, third: 50}),
+        ]
+
+    def setUp(self):
+        self.clients = []
+        for user in (self.author, *self.buyers):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients.append(client)
+
+    def assert_totals(self):
+        """Итоги совпадают с суммой по корзинам, посчитанной заново."""
+        for user in User.objects.all():
+            expected = dict(IngredientInRecipe.objects.filter(
+                recipe__shopping_cart__user=user
+            ).values('ingredient_id').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient_id', 'total'))
+            totals = dict(ShoppingCartTotal.objects.filter(
+                user=user
+            ).values_list('ingredient_id', 'amount'))
+            self.assertEqual(totals, expected, user.username)
+
+    def fill_carts(self):
+        for client in self.clients[1:]:
+            for recipe in self.recipes:
+                response = client.post(
+                    f'/api/recipes/{recipe.id}/shopping_cart/'
+                )
+                self.assertEqual(response.status_code, 201)
+
+    def test_add_and_delete_from_cart(self):
+        self.fill_carts()
+        self.assert_totals()
+        response = self.clients[1].delete(
+            f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_recipe_ingredients_update(self):
+        self.fill_carts()
+        first, _, third, fourth = self.ingredients
+        response = self.clients[0].patch(
+            f'/api/recipes/{self.recipes[0].id}/',
+            {
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': first.id, 'amount': 150},
+                    {'id': third.id, 'amount': 5},
+                    {'id': fourth.id, 'amount': 1},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+
+    def test_ingredient_admin_edits(self):
+        self.fill_carts()
+        model_admin = IngredientInRecipeAdmin(IngredientInRecipe, None)
+        item = IngredientInRecipe.objects.get(
+            recipe=self.recipes[0], ingredient=self.ingredients[0]
+        )
+        item.amount = 30
+        model_admin.save_model(None, item, None, True)
+        self.assert_totals()
+        model_admin.save_model(None, IngredientInRecipe(
+            recipe=self.recipes[1], ingredient=self.ingredients[3], amount=7
+        ), None, False)
+        self.assert_totals()
+        model_admin.delete_model(None, item)
+        self.assert_totals()
+        model_admin.delete_queryset(None, IngredientInRecipe.objects.filter(
+            recipe=self.recipes[1]
+        ))
+        self.assert_totals()
+
+    def test_recipe_delete(self):
+        self.fill_carts()
+        response = self.clients[0].delete(
+            f'/api/recipes/{self.recipes[0].id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_user_delete(self):
+        self.fill_carts()
+        self.buyers[0].delete()
+        self.assertFalse(ShoppingCartTotal.objects.filter(
+            user_id=self.buyers[0].id
+        ).exists())
+        self.assert_totals()
+
+
+class CounterTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Тестовый',
+        )
+        cls.readers = [
+            User.objects.create(
+                email=f'reader{number}@example.com',
+                username=f'reader{number}',
+                first_name='Читатель', last_name='Тестовый',
+            )
+            for number in range(2)
+        ]
+        cls.tag = Tag.objects.create(name='Тег', color='#000000', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г'
+        )
+        cls.recipes = [
+            create_recipe(cls.author, [cls.tag], {ingredient: number + 1})
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        self.clients = []
+        for user in (self.author, *self.readers):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients.append(client)
+
+    def assert_counters(self):
+        # verify падает с CommandError на любом расхождении.
+        call_command('reconcile_counters', 'verify', stdout=StringIO())
+
+    def fill(self):
+        for client in self.clients[1:]:
+            for recipe in self.recipes:
+                for action in ('favorite', 'shopping_cart'):
+                    response = client.post(
+                        f'/api/recipes/{recipe.id}/{action}/'
+                    )
+                    self.assertEqual(response.status_code, 201)
+            response = client.post(
+                f'/api/users/{self.author.id}/subscribe/'
+            )
+            self.assertEqual(response.status_code, 201)
+
+    def test_api_counters(self):
+        self.fill()
+        self.assert_counters()
+        recipe = Recipe.objects.get(id=self.recipes[0].id)
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (2, 2)
+        )
+        author = User.objects.get(id=self.author.id)
+        self.assertEqual(
+            (author.recipes_count, author.followers_count), (2, 2)
+        )
+
+        client = self.clients[1]
+        for path in (
+            f'/api/recipes/{recipe.id}/favorite/',
+            f'/api/recipes/{recipe.id}/shopping_cart/',
+            f'/api/users/{self.author.id}/subscribe/',
+        ):
+            self.assertEqual(client.delete(path).status_code, 204)
+        self.assert_counters()
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count), (1, 1)
+        )
+        response = self.clients[0].delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters()
+
+    def test_cascade_deletes(self):
+        self.fill()
+        # Удаляются копии: объекты setUpTestData общие для тестов.
+        User.objects.get(id=self.readers[0].id).delete()
+        self.assert_counters()
+        Recipe.objects.get(id=self.recipes[0].id).delete()
+        self.assert_counters()
+        User.objects.get(id=self.author.id).delete()
+        self.assert_counters()
+
+    def test_admin_deletes(self):
+        self.fill()
+        FavouriteAdmin(Favourite, None).delete_model(
+            None, Favourite.objects.filter(user=self.readers[0]).first()
+        )
+        FavouriteAdmin(Favourite, None).delete_queryset(
+            None, Favourite.objects.filter(user=self.readers[1])
+        )
+        ShoppingCartAdmin(ShoppingCart, None).delete_queryset(
+            None, ShoppingCart.objects.filter(recipe=self.recipes[0])
+        )
+        self.assert_counters()
+
+    def test_reconcile_repair(self):
+        self.fill()
+        Recipe.objects.filter(id=self.recipes[0].id).update(
+            favorites_count=10, in_carts_count=0
+        )
+        User.objects.filter(id=self.author.id).update(
+            recipes_count=0, followers_count=5
+        )
+        with self.assertRaises(CommandError):
+            self.assert_counters()
+        call_command('reconcile_counters', 'repair', stdout=StringIO())
+        self.assert_counters()
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTestCase(TestCase):
+
+    def setUp(self):
+        self.reader, self.other, self.author, self.star = [
+            User.objects.create(
+                email=f'{name}@example.com', username=name,
+                first_name='Пользователь', last_name='Тестовый',
+            )
+            for name in ('reader', 'other', 'author', 'star')
+        ]
+        self.tag = Tag.objects.create(
+            name='Тег', color='#000000', slug='tag'
+        )
+        self.clients = {}
+        for user in (self.reader, self.other):
+            client = APIClient()
+            client.force_authenticate(user)
+            self.clients[user] = client
+        # Опубликованные до подписки рецепты попадают в ленту при ней.
+        self.publish(self.author, 2)
+        self.subscribe(self.reader, self.author)
+        # У star подписчиков больше порога: его рецепты не раскладываются.
+        self.subscribe(self.reader, self.star)
+        self.subscribe(self.other, self.star)
+        for _ in range(2):
+            self.publish(self.author, 1)
+            self.publish(self.star, 2)
+
+    def publish(self, author, count):
+        # Свежий автор: раскладка смотрит на его followers_count.
+        author = User.objects.get(id=author.id)
+        for _ in range(count):
+            create_recipe(author, [self.tag], {})
+
+    def subscribe(self, user, author):
+        response = self.clients[user].post(
+            f'/api/users/{author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def assert_feed(self):
+        """Лента по страницам совпадает с прямым запросом по подпискам."""
+        ids = []
+        path = '/api/recipes/feed/?limit=2'
+        while path:
+            response = self.clients[self.reader].get(path)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.json()['results']]
+            path = response.json()['next']
+        self.assertEqual(ids, list(Recipe.objects.filter(
+            author__following__user=self.reader
+        ).order_by('-created', '-id').values_list('id', flat=True)))
+
+    def test_feed_matches_pull_query(self):
+        self.assertFalse(FeedEntry.objects.filter(author=self.star).exists())
+        self.assert_feed()
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(FeedEntry.objects.count(), 4)
+        self.assert_feed()
+        # author стал популярным после раскладки: записи не дублируются.
+        self.subscribe(self.other, self.author)
+        self.publish(self.author, 1)
+        self.assert_feed()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assert_feed()
+
+    def test_unsubscribe_trims_feed(self):
+        response = self.clients[self.reader].delete(
+            f'/api/users/{self.author.id}/subscribe/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assert_feed()
+
+    def test_admin_delete_follow(self):
+        key = FOLLOWED_AUTHORS_KEY.format(self.reader.id)
+        cache.set(key, [self.author.id, self.star.id])
+        FollowAdmin(Follow, None).delete_queryset(
+            None, Follow.objects.filter(user=self.reader)
+        )
+        run_on_commit()
+        self.assertIsNone(cache.get(key))
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assert_feed()
+        self.assertEqual(
+            list(User.objects.filter(
+                id__in=(self.author.id, self.star.id)
+            ).order_by('id').values_list('followers_count', flat=True)),
+            [0, 1],
+        )
+        call_command('reconcile_counters', 'verify', stdout=StringIO())
+
+
+class RecipeUpdateTestCase(TestCase):
+    tables = (TagRecipe._meta.db_table, IngredientInRecipe._meta.db_table)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Тестовый',
+        )
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {number}', color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        first, second, third, _ = cls.ingredients
+        cls.recipe = create_recipe(
+            cls.author, cls.tags[:2], {first: 100, second: 2, third: 50}
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, tags, amounts):
+        return self.client.patch(
+            f'/api/recipes/{self.recipe.id}/',
+            {
+                'tags': [tag.id for tag in tags],
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': amount}
+                    for ingredient, amount in amounts.items()
+                ],
+            },
+            format='json',
+        )
+
+    def amounts(self):
+        return dict(IngredientInRecipe.objects.filter(
+            recipe=self.recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def test_unchanged_patch_does_not_write_relations(self):
+        first, second, third, _ = self.ingredients
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch(
+                self.tags[:2], {third: 50, first: 100, second: 2}
+            )
+        self.assertEqual(response.status_code, 200)
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].lstrip().startswith(
+                ('INSERT', 'UPDATE', 'DELETE')
+            )
+            and any(table in query['sql'] for table in self.tables)
+        ]
+        self.assertEqual(writes, [])
+
+    def test_mixed_changes(self):
+        first, second, third, fourth = self.ingredients
+        deltas = RecipeWriteSerializer().update_ingredients_amounts(
+            self.recipe, [
+                {'id': first.id, 'amount': 100},
+                {'id': second.id, 'amount': 5},
+                {'id': fourth.id, 'amount': 7},
+            ]
+        )
+        self.assertEqual(
+            deltas, {second.id: 3, third.id: -50, fourth.id: 7}
+        )
+        self.assertEqual(
+            self.amounts(), {first.id: 100, second.id: 5, fourth.id: 7}
+        )
+
+    def test_patch_replaces_tags_and_ingredients(self):
+        first, _, third, fourth = self.ingredients
+        response = self.patch(
+            self.tags[1:], {first: 1, third: 50, fourth: 4}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(self.recipe.tags.values_list('id', flat=True)),
+            {tag.id for tag in self.tags[1:]},
+        )
+        self.assertEqual(
+            self.amounts(), {first.id: 1, third.id: 50, fourth.id: 4}
+        )
+
+
+class MultiPartJSONParserTestCase(TestCase):
+
+    def test_data_part_must_be_object(self):
+        user = User.objects.create(email='cook@example.com', username='cook')
+        client = APIClient()
+        client.force_authenticate(user)
+        for payload in ('[1, 2]', '"x"', '3', 'null'):
+            with self.subTest(payload=payload):
+                response = client.post(
+                    '/api/recipes/', {'data': payload}, format='multipart'
+                )
+                self.assertEqual(response.status_code, 400)
@@ -1,20 +1,31 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseNotModified, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.status import HTTP_400_BAD_REQUEST
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from recipes.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, Tag)
+from recipes.indexes import ingredient_index
+from recipes.models import (Favourite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartTotal, Tag)
 from users.serializers import RecipeShortSerializer
+
+from . import projections
+from .caching import AnonymousResponseCacheMixin
+from .exports import (EXPORTERS, SHOPPING_LIST_RENDERERS, buffered,
+                      shopping_list_etag, shopping_list_rows)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .pagination import CustomPagination, FeedPagination, KeysetPagination
+from .parsers import MultiPartJSONParser
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
 from .serializers import (IngredientSerializer, RecipeReadSerializer,
                           RecipeWriteSerializer, TagSerializer)
@@ -26,18 +37,60 @@ class TagViewSet(ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     pagination_class = CustomPagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    counters = {
+        Favourite: 'favorites_count',
+        ShoppingCart: 'in_carts_count',
+    }
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.is_requested(self.request):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user
+        )
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    def list(self, request, *args, **kwargs):
+        if not settings.API_PROJECTIONS_ENABLED:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(self.projected_list, request)
+
+    def projected_list(self, request):
+        return self.page_response(
+            self.paginator, self.filter_queryset(self.get_queryset())
+        )
+
+    def page_response(self, paginator, queryset):
+        if settings.API_PROJECTIONS_ENABLED:
+            page = paginator.paginate_queryset(
+                projections.recipe_page(queryset), self.request, view=self
+            )
+            data = projections.recipes(page, self.request)
+        else:
+            page = paginator.paginate_queryset(
+                queryset, self.request, view=self
+            )
+            data = self.get_serializer(page, many=True).data
+        return paginator.get_paginated_response(data)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -61,55 +114,73 @@ class RecipeViewSet(ModelViewSet):
             return self.add_to(ShoppingCart, request.user, pk)
         return self.delete_from(ShoppingCart, request.user, pk)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        return self.page_response(FeedPagination(), self.get_queryset())
+
+    @action(detail=False)
+    def trending(self, request):
+        queryset = self.get_queryset().filter(
+            score__isnull=False
+        ).order_by('-score__score', '-id')
+        # Курсорная пагинация упорядочивает по дате, рейтингу нужны страницы.
+        return self.page_response(self.pagination_class(), queryset)
+
+    @transaction.atomic
     def add_to(self, model, user, pk):
         if model.objects.filter(user=user, recipe__id=pk).exists():
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
         model.objects.create(user=user, recipe=recipe)
+        counter = self.counters[model]
+        Recipe.objects.filter(id=pk).update(**{counter: F(counter) + 1})
+        if model is ShoppingCart:
+            ShoppingCartTotal.objects.add_recipe([user.id], recipe)
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_from(self, model, user, pk):
         obj = model.objects.filter(user=user, recipe__id=pk)
         if obj.exists():
-            obj.delete()
+            deleted, _ = obj.delete()
+            counter = self.counters[model]
+            Recipe.objects.filter(id=pk).update(
+                **{counter: F(counter) - deleted}
+            )
+            if model is ShoppingCart:
+                ShoppingCartTotal.objects.add_recipe([user.id], pk, sign=-1)
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
     @action(
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
     )
     def download_shopping_cart(self, request):
         user = request.user
         if not user.shopping_cart.exists():
             return Response(status=HTTP_400_BAD_REQUEST)
 
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(volume=Sum('amount'))
-
+        export_format = request.accepted_renderer.format
         today = timezone.now()
-        shopping_list = (
-            f'Список покупок для: {user.get_full_name()}\n\n'
-            f'Дата: {today:%Y-%m-%d}\n\n'
+        etag = shopping_list_etag(user, export_format, today)
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            return HttpResponseNotModified()
+
+        response = StreamingHttpResponse(
+            buffered(EXPORTERS[export_format](
+                shopping_list_rows(user), user, today
+            )),
+            content_type=request.accepted_renderer.media_type,
         )
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["volume"]}'
-            for ingredient in ingredients
-        ])
-        shopping_list += f'\n\nFoodgram ({today:%Y})'
-
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        filename = f'{user.username}_shopping_list.{export_format}'
         response['Content-Disposition'] = f'attachment; filename={filename}'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
 
         return response
 
@@ -120,3 +191,14 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        if settings.INGREDIENT_INDEX_ENABLED:
+            return Response(ingredient_index.search(
+                request.query_params.get('name', '')
+            ))
+        if settings.API_PROJECTIONS_ENABLED:
+            return Response(projections.ingredients(
+                self.filter_queryset(self.get_queryset())
+            ))
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,113 @@
+"""Чтение с реплик базы.
+
+Реплики перечисляются в переменной DB_REPLICAS. Чтения безопасных
+запросов уходят на случайную здоровую реплику, всё остальное - на
+основную базу: записи, запросы на запись целиком и код вне запросов
+(команды, миграции). После запроса на запись клиент получает cookie,
+и пока она жива, его чтения тоже идут в основную базу, чтобы он сразу
+видел свои изменения.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+state = threading.local()
+# Реплика, не ответившая на подключение, и момент повторной попытки.
+unhealthy = {}
+
+
+def healthy(alias):
+    if unhealthy.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        unhealthy[alias] = time.monotonic() + settings.REPLICA_RETRY_INTERVAL
+        return False
+    unhealthy.pop(alias, None)
+    return True
+
+
+def choose_replica():
+    replicas = list(settings.DATABASE_REPLICAS)
+    random.shuffle(replicas)
+    for alias in replicas:
+        if healthy(alias):
+            return alias
+    return DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_primary():
+    """Чтения внутри блока идут в основную базу."""
+    primary = getattr(state, 'primary', True)
+    state.primary = True
+    try:
+        yield
+    finally:
+        state.primary = primary
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if getattr(state, 'primary', True):
+            return DEFAULT_DB_ALIAS
+        # Реплика выбирается один раз на запрос: иначе соседние
+        # запросы одной страницы читали бы разные снимки данных.
+        if getattr(state, 'replica', None) is None:
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Выбирает базу для чтений запроса и ставит cookie после записи."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state.primary = not self.use_replica(request)
+        state.replica = None
+        try:
+            response = self.get_response(request)
+        finally:
+            state.primary = True
+            state.replica = None
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+            )
+        return response
+
+    def use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        try:
+            sticky_until = float(
+                request.COOKIES.get(settings.REPLICA_STICKY_COOKIE, 0)
+            )
+        except ValueError:
+            sticky_until = 0
+        return sticky_until < time.time()
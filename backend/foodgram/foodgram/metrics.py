@@ -0,0 +1,199 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Каждый процесс копит значения в памяти и раз в METRICS_FLUSH_INTERVAL
+секунд атомарно сбрасывает их в свой файл METRICS_DIR/<pid>.json.
+/metrics суммирует файлы всех процессов, поэтому работает и под
+несколькими воркерами gunicorn.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+METRICS = {
+    'foodgram_requests_total': (
+        'counter', 'Requests by view, action and status class.', None,
+    ),
+    'foodgram_request_duration_seconds': (
+        'histogram', 'Total request time.', DURATION_BUCKETS,
+    ),
+    'foodgram_db_queries': (
+        'histogram', 'SQL queries per request.', QUERY_BUCKETS,
+    ),
+    'foodgram_db_duration_seconds_total': (
+        'counter', 'Time spent in SQL queries.', None,
+    ),
+    'foodgram_response_bytes_total': (
+        'counter', 'Response body size.', None,
+    ),
+    'foodgram_db_connections_opened_total': (
+        'counter', 'New database connections.', None,
+    ),
+    'foodgram_db_connections_reused_total': (
+        'counter', 'Requests started on a persistent connection.', None,
+    ),
+    'foodgram_db_connections_broken_total': (
+        'counter', 'Persistent connections closed by the health check.',
+        None,
+    ),
+}
+
+
+class Registry:
+    """Счётчики и гистограммы одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.flushed = time.monotonic()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def check_pid(self):
+        # После fork значения родителя принадлежат не этому процессу.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.check_pid()
+            self.counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        with self.lock:
+            self.check_pid()
+            # Счётчики по корзинам, затем +Inf, сумма и количество.
+            histogram = self.histograms.setdefault(
+                (name, labels), [0] * (len(buckets) + 3)
+            )
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    break
+            else:
+                index = len(buckets)
+            histogram[index] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self.check_pid()
+            return {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, labels, list(values)]
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (
+            not force and now - self.flushed < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        self.flushed = now
+        os.makedirs(directory, exist_ok=True)
+        path = Path(directory, f'{os.getpid()}.json')
+        temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Сумма значений всех процессов."""
+        if not settings.METRICS_DIR:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush(force=True)
+            snapshots = []
+            for path in Path(settings.METRICS_DIR).glob('*.json'):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        counters = defaultdict(float)
+        histograms = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, values in snapshot['histograms']:
+                total = histograms.setdefault(
+                    (name, tuple(map(tuple, labels))), [0] * len(values)
+                )
+                for index, value in enumerate(values):
+                    total[index] += value
+        return counters, histograms
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', r'\\').replace(
+            '"', r'\"'
+        ))
+        for key, value in pairs
+    ) + '}'
+
+
+def format_value(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render(counters, histograms):
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (sample, labels), value in sorted(counters.items()):
+            if sample == name:
+                lines.append(
+                    f'{name}{format_labels(labels)} {format_value(value)}'
+                )
+        for (sample, labels), values in sorted(histograms.items()):
+            if sample != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{format_labels(labels, le=bound)} '
+                    f'{cumulative}'
+                )
+            lines.append(
+                f'{name}_sum{format_labels(labels)} {format_value(values[-2])}'
+            )
+            lines.append(f'{name}_count{format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+def metrics_view(request):
+    return HttpResponse(
+        render(*registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,139 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import registry
+
+
+class QueryStats:
+    """Число и время SQL-запросов через connection.execute_wrapper."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+    def wrap(self):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class MetricsMiddleware:
+    """Метрики по каждому действию view и заголовок Server-Timing."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        started = time.perf_counter()
+        with stats.wrap():
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"'
+            f', total;dur={duration * 1000:.1f}'
+        )
+        labels = getattr(
+            request, 'metrics_labels',
+            (('view', 'unresolved'), ('action', request.method.lower())),
+        ) + (('method', request.method),)
+        if response.streaming:
+            # Запросы потокового ответа выполняются уже после возврата.
+            response.streaming_content = self.stream(
+                response.streaming_content, labels, response.status_code,
+                stats, started,
+            )
+        else:
+            self.record(
+                labels, response.status_code, stats, started,
+                len(response.content),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'cls', view_func)
+        action = request.method.lower()
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            action = actions.get(action, action)
+        request.metrics_labels = (
+            ('view', view.__name__), ('action', action)
+        )
+
+    def stream(self, content, labels, status, stats, started):
+        size = 0
+        with stats.wrap():
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        self.record(labels, status, stats, started, size)
+
+    def record(self, labels, status, stats, started, size):
+        registry.inc('foodgram_requests_total', labels + (
+            ('status', f'{status // 100}xx'),
+        ))
+        registry.observe(
+            'foodgram_request_duration_seconds', labels,
+            time.perf_counter() - started,
+        )
+        registry.observe('foodgram_db_queries', labels, stats.count)
+        registry.inc(
+            'foodgram_db_duration_seconds_total', labels, stats.duration
+        )
+        registry.inc('foodgram_response_bytes_total', labels, size)
+        registry.flush()
+
+
+class ConnectionMiddleware:
+    """Проверяет постоянные соединения с базой перед запросом.
+
+    Django 2.2 узнаёт о разорванном соединении только по ошибке
+    запроса, поэтому соединение, закрытое сервером базы, проверяется
+    заранее и открывается заново.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED and not (
+            settings.DB_CONN_HEALTH_CHECKS
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        opened = set()
+        for connection in connections.all():
+            labels = (('database', connection.alias),)
+            if connection.connection is not None:
+                if not settings.DB_CONN_HEALTH_CHECKS or (
+                    connection.is_usable()
+                ):
+                    registry.inc(
+                        'foodgram_db_connections_reused_total', labels
+                    )
+                    continue
+                connection.close()
+                registry.inc('foodgram_db_connections_broken_total', labels)
+            opened.add(connection.alias)
+        response = self.get_response(request)
+        for alias in opened:
+            if connections[alias].connection is not None:
+                registry.inc(
+                    'foodgram_db_connections_opened_total',
+                    (('database', alias),),
+                )
+        return response
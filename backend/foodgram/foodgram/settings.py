@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -60,6 +61,11 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 DJOSER = {
@@ -79,6 +85,9 @@ DJOSER = {
 
 
 MIDDLEWARE = [
+    'foodgram.middleware.MetricsMiddleware',
+    'foodgram.middleware.ConnectionMiddleware',
+    'foodgram.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -118,7 +127,55 @@ DATABASES = {
         'USER': os.environ.get('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', default='my_password'),
         'HOST': os.environ.get('DB_HOST', default='db'),
-        'PORT': os.environ.get('DB_PORT', '5432')
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Секунды жизни соединения, 0 - новое на каждый запрос.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', default=0)),
+    }
+}
+DB_CONN_HEALTH_CHECKS = os.environ.get(
+    'DB_CONN_HEALTH_CHECKS', default='True'
+) == 'True'
+
+# Реплики через запятую: хосты PostgreSQL или файлы SQLite.
+REPLICA_ADDRESS_KEY = (
+    'NAME' if DATABASES['default']['ENGINE'].endswith('sqlite3') else 'HOST'
+)
+DATABASE_REPLICAS = []
+for address in os.environ.get('DB_REPLICAS', default='').split(','):
+    if address.strip():
+        alias = f'replica_{len(DATABASE_REPLICAS)}'
+        DATABASES[alias] = dict(DATABASES['default'], TEST={
+            'MIRROR': 'default',
+        })
+        DATABASES[alias][REPLICA_ADDRESS_KEY] = address.strip()
+        DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+REPLICA_STICKY_COOKIE = 'primary_until'
+REPLICA_STICKY_SECONDS = int(
+    os.environ.get('REPLICA_STICKY_SECONDS', default=10)
+)
+REPLICA_RETRY_INTERVAL = 30
+
+# locmem живёт в памяти одного процесса; чтобы штампы версий и кеш
+# ответов были общими для воркеров gunicorn, нужен file.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[
+            os.environ.get('CACHE_BACKEND', default='locmem')
+        ],
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache'),
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.environ.get('CACHE_MAX_ENTRIES', default=10000)
+            ),
+        },
     }
 }
 
@@ -168,3 +225,72 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+FOLLOWED_AUTHORS_CACHE_TIMEOUT = int(
+    os.environ.get('FOLLOWED_AUTHORS_CACHE_TIMEOUT', default=0)
+)
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_RESPONSE_CACHE_TIMEOUT', default=0)
+)
+# Общие для всех пользователей части представлений рецептов.
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_FRAGMENT_CACHE_TIMEOUT', default=0)
+)
+
+INGREDIENT_INDEX_ENABLED = os.environ.get(
+    'INGREDIENT_INDEX_ENABLED', default='False'
+) == 'True'
+RECIPE_INGREDIENT_INDEX_ENABLED = os.environ.get(
+    'RECIPE_INGREDIENT_INDEX_ENABLED', default='False'
+) == 'True'
+# Больше id рецептов не передаются в SQL списком, фильтр идёт подзапросами.
+RECIPE_INGREDIENT_INDEX_MAX_IDS = int(
+    os.environ.get('RECIPE_INGREDIENT_INDEX_MAX_IDS', default=10000)
+)
+INDEX_VERSION_CHECK_INTERVAL = float(
+    os.environ.get('INDEX_VERSION_CHECK_INTERVAL', default=1)
+)
+# Списки рецептов, ингредиентов и подписок собираются из values_list().
+API_PROJECTIONS_ENABLED = os.environ.get(
+    'API_PROJECTIONS_ENABLED', default='True'
+) == 'True'
+
+IMAGE_PIPELINE_ENABLED = os.environ.get(
+    'IMAGE_PIPELINE_ENABLED', default='False'
+) == 'True'
+RECIPE_IMAGE_VARIANTS = {
+    'small': (320, 320),
+    'medium': (800, 800),
+    'large': (1600, 1600),
+}
+RECIPE_IMAGE_QUALITY = 85
+IMAGE_JOB_TIMEOUT = 300
+IMAGE_JOB_MAX_ATTEMPTS = 3
+
+# Авторы с большим числом подписчиков не раскладываются по лентам.
+FEED_FANOUT_MAX_FOLLOWERS = int(
+    os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', default=1000)
+)
+FEED_BACKFILL_SIZE = 100
+
+# Период полураспада рейтинга популярности, часы.
+TRENDING_HALF_LIFE = float(
+    os.environ.get('TRENDING_HALF_LIFE', default=24)
+)
+TRENDING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 0.5,
+}
+TRENDING_LAG = 60
+TRENDING_HISTORY = 10
+TRENDING_REBASE_AFTER = 20
+TRENDING_BATCH_SIZE = 1000
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', default='True') == 'True'
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_metrics'),
+)
+METRICS_FLUSH_INTERVAL = float(
+    os.environ.get('METRICS_FLUSH_INTERVAL', default=1)
+)
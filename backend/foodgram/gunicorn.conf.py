@@ -0,0 +1,29 @@
+"""Настройки gunicorn.
+
+Воркеры gthread: пока один поток ждёт базу, процесс обслуживает
+запросы других потоков. Медленных клиентов берёт на себя nginx,
+буферизуя запросы и ответы.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('GUNICORN_BIND', default='0:8000')
+workers = int(os.environ.get(
+    'GUNICORN_WORKERS', default=multiprocessing.cpu_count() * 2 + 1
+))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', default=4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', default=30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', default=5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', default=0))
+max_requests_jitter = max_requests // 10
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска принадлежат завершённым процессам.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    if settings.METRICS_DIR:
+        shutil.rmtree(settings.METRICS_DIR, ignore_errors=True)
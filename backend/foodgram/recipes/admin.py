@@ -1,12 +1,111 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
 
-from .models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
-                     ShoppingCart, Tag, TagRecipe)
+from .indexes import RecipeIngredientIndex
+from .models import (Favourite, ImageJob, Ingredient, IngredientInRecipe,
+                     Recipe, RecipeImageVariant, RecipeScore, ShoppingCart,
+                     ShoppingCartTotal, Tag, TagRecipe)
 
 admin.site.register(Tag)
 admin.site.register(Ingredient)
 admin.site.register(Recipe)
 admin.site.register(TagRecipe)
-admin.site.register(IngredientInRecipe)
-admin.site.register(Favourite)
-admin.site.register(ShoppingCart)
+admin.site.register(ImageJob)
+admin.site.register(RecipeImageVariant)
+admin.site.register(RecipeScore)
+
+
+def apply_to_carts(item, sign):
+    """Прибавляет (sign=1) или вычитает (sign=-1) строку рецепта
+    из итогов корзин, в которых лежит рецепт."""
+    ShoppingCartTotal.objects.apply_deltas(
+        ShoppingCart.objects.filter(
+            recipe_id=item.recipe_id
+        ).values_list('user_id', flat=True),
+        {item.ingredient_id: sign * item.amount},
+    )
+
+
+@admin.register(IngredientInRecipe)
+class IngredientInRecipeAdmin(admin.ModelAdmin):
+    """Правки в обход API перестраивают индекс рецептов по ингредиентам
+    и переносят изменения количеств в итоги корзин, как API."""
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        if change:
+            apply_to_carts(IngredientInRecipe.objects.get(pk=obj.pk), -1)
+        super().save_model(request, obj, form, change)
+        apply_to_carts(obj, 1)
+        transaction.on_commit(RecipeIngredientIndex.bump_version)
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(
+            request, IngredientInRecipe.objects.filter(pk=obj.pk)
+        )
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for item in queryset:
+            apply_to_carts(item, -1)
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(RecipeIngredientIndex.bump_version)
+
+
+class NoAddChangeAdmin(admin.ModelAdmin):
+    """Записи только просматриваются и удаляются.
+
+    Удаление остаётся доступным: без него админка не дала бы удалить
+    пользователя или рецепт, от которых записи удаляются каскадом.
+    """
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(NoAddChangeAdmin):
+    """Корзина меняется через API, которое ведёт её итоги и счётчики.
+
+    Удаление из админки вычитает рецепты из итогов так же, как API.
+    """
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, ShoppingCart.objects.filter(pk=obj.pk))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for user_id, recipe_id in queryset.values_list('user_id', 'recipe_id'):
+            ShoppingCartTotal.objects.add_recipe([user_id], recipe_id, sign=-1)
+            Recipe.objects.filter(id=recipe_id).update(
+                in_carts_count=F('in_carts_count') - 1
+            )
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(Favourite)
+class FavouriteAdmin(NoAddChangeAdmin):
+    """Избранное меняется через API, которое ведёт favorites_count.
+
+    Удаление из админки уменьшает счётчик так же, как API.
+    """
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Favourite.objects.filter(pk=obj.pk))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        for recipe_id in queryset.values_list('recipe_id', flat=True):
+            Recipe.objects.filter(id=recipe_id).update(
+                favorites_count=F('favorites_count') - 1
+            )
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(ShoppingCartTotal)
+class ShoppingCartTotalAdmin(NoAddChangeAdmin):
+    """Итоги пересчитывает команда shopping_cart_totals."""
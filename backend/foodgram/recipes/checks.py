@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+INDEX_SETTINGS = (
+    'INGREDIENT_INDEX_ENABLED', 'RECIPE_INGREDIENT_INDEX_ENABLED',
+)
+
+
+@register()
+def index_cache_check(app_configs, **kwargs):
+    """Версии индексов и журнал правок живут в кеше: у кеша процесса
+    каждый воркер видел бы свои и не узнавал о чужих правках."""
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, (LocMemCache, DummyCache)):
+        return []
+    return [
+        Error(
+            f'{name} requires a cache shared between processes.',
+            hint='Set CACHE_BACKEND=file.',
+            obj=type(backend).__name__,
+            id='recipes.E001',
+        )
+        for name in INDEX_SETTINGS if getattr(settings, name)
+    ]
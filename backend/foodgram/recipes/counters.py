@@ -0,0 +1,39 @@
+"""Денормализованные счётчики и их сверка с исходными таблицами.
+
+Функции принимают реестр моделей: миграция передаёт исторический,
+команда reconcile_counters - django.apps.apps.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+# Модель, поле счётчика, модель-источник и её ссылка на модель.
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favourite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Follow', 'author'),
+)
+
+
+def actual_count(apps, source, field):
+    return Coalesce(Subquery(
+        apps.get_model(source).objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), Value(0))
+
+
+def drifted(apps, model, counter, source, field):
+    """Строки, где счётчик расходится с числом строк источника."""
+    return apps.get_model(model).objects.annotate(
+        actual=actual_count(apps, source, field)
+    ).exclude(**{counter: F('actual')})
+
+
+def repair(apps, model, counter, source, field):
+    """Пересчитывает разошедшиеся счётчики одним UPDATE."""
+    return drifted(apps, model, counter, source, field).update(
+        **{counter: actual_count(apps, source, field)}
+    )
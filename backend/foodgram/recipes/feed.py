@@ -0,0 +1,136 @@
+"""Лента рецептов от авторов, на которых подписан пользователь.
+
+Рецепт обычного автора при публикации раскладывается в FeedEntry
+всех его подписчиков. У авторов с числом подписчиков больше
+FEED_FANOUT_MAX_FOLLOWERS раскладка слишком дорогая: их рецепты
+подмешиваются при чтении. Страница ленты - слияние входящих
+и последних рецептов каждого популярного автора
+по ключу (created, id), все читаются по индексу.
+
+Если автор опустился ниже порога, рецепты, опубликованные им
+в популярности, в ленты не попадут до rebuild_feeds.
+"""
+import heapq
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+
+from users.models import Follow, User
+from .models import FeedEntry, Recipe
+
+BATCH_SIZE = 1000
+
+
+def is_popular(author):
+    return author.followers_count > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def create_entries(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(recipe):
+    """Кладёт новый рецепт в ленты подписчиков автора."""
+    if is_popular(recipe.author):
+        return
+    create_entries(
+        FeedEntry(
+            user_id=user_id, author_id=recipe.author_id,
+            recipe_id=recipe.id, created=recipe.created,
+        )
+        for user_id in Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list('user_id', flat=True).iterator()
+    )
+
+
+def backfill(user, author):
+    """Кладёт в ленту последние рецепты автора после подписки."""
+    if is_popular(author):
+        return
+    create_entries(
+        FeedEntry(
+            user=user, author=author, recipe_id=recipe_id, created=created
+        )
+        for recipe_id, created in Recipe.objects.filter(
+            author=author
+        ).order_by('-created', '-id').values_list(
+            'id', 'created'
+        )[:settings.FEED_BACKFILL_SIZE]
+    )
+
+
+def trim(user, author):
+    """Убирает рецепты автора из ленты после отписки."""
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты из подписок, возвращает число записей."""
+    FeedEntry.objects.all().delete()
+    authors = User.objects.filter(
+        followers_count__gt=0,
+        followers_count__lte=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    )
+    recent = defaultdict(list)
+    for recipe_id, author_id, created in Recipe.objects.filter(
+        author__in=authors
+    ).limited_per_author(settings.FEED_BACKFILL_SIZE).values_list(
+        'id', 'author_id', 'created'
+    ).iterator():
+        recent[author_id].append((recipe_id, created))
+    create_entries(
+        FeedEntry(
+            user_id=user_id, author_id=author_id,
+            recipe_id=recipe_id, created=created,
+        )
+        for user_id, author_id in Follow.objects.filter(
+            author__in=authors
+        ).values_list('user_id', 'author_id').iterator()
+        for recipe_id, created in recent[author_id]
+    )
+    return FeedEntry.objects.count()
+
+
+def after(queryset, position, id_field):
+    if position is None:
+        return queryset
+    created, pk = position
+    return queryset.filter(
+        Q(created__lt=created) | Q(created=created, **{f'{id_field}__lt': pk})
+    )
+
+
+def page_ids(user, position, limit):
+    """id рецептов ленты после позиции (created, id), новые первыми."""
+    inbox = after(
+        FeedEntry.objects.filter(user=user), position, 'recipe_id'
+    ).order_by('-created', '-recipe_id').values_list(
+        'created', 'recipe_id'
+    )[:limit]
+    # По запросу на автора: каждый читает limit строк по индексу,
+    # а не сортирует все рецепты популярных авторов.
+    popular = [
+        after(
+            Recipe.objects.filter(author_id=author_id), position, 'id'
+        ).order_by('-created', '-id').values_list('created', 'id')[:limit]
+        for author_id in User.objects.filter(
+            following__user=user,
+            followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+        ).values_list('id', flat=True)
+    ]
+    ids = []
+    for _, recipe_id in heapq.merge(inbox, *popular, reverse=True):
+        # Автор мог стать популярным уже после раскладки.
+        if not ids or ids[-1] != recipe_id:
+            ids.append(recipe_id)
+        if len(ids) == limit:
+            break
+    return ids
@@ -0,0 +1,95 @@
+import hashlib
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .models import Recipe, RecipeImageVariant
+from .signals import recipe_changed
+
+# Имена, которые даёт save_by_hash: такой файл уже перекодирован
+# и может быть общим у нескольких рецептов.
+HASHED_NAME = re.compile(r'recipes/(variants/)?[0-9a-f]{2}/[0-9a-f]{64}\.jpg')
+
+
+def encode_jpeg(image):
+    """Перекодирует картинку в JPEG без метаданных."""
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        format='JPEG',
+        quality=settings.RECIPE_IMAGE_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return buffer.getvalue()
+
+
+def save_by_hash(content, directory):
+    """Сохраняет файл под именем из хеша содержимого, повторы не пишет."""
+    digest = hashlib.sha256(content).hexdigest()
+    name = f'{directory}{digest[:2]}/{digest}.jpg'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def load_rgb(field_file):
+    with field_file.open('rb') as image_file:
+        image = Image.open(image_file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def process_recipe_image(recipe):
+    """Перекодирует картинку рецепта и готовит варианты размеров.
+
+    Исходный загруженный файл заменяется перекодированным, если за
+    время обработки картинку рецепта не сменили. Уже перекодированные
+    картинки пропускаются, а исходный файл удаляется, только если
+    на него больше никто не ссылается.
+    """
+    raw_name = recipe.image.name
+    if HASHED_NAME.fullmatch(raw_name):
+        return
+    image = load_rgb(recipe.image)
+    name = save_by_hash(encode_jpeg(image), 'recipes/')
+    variants = []
+    for size, box in settings.RECIPE_IMAGE_VARIANTS.items():
+        variant = image.copy()
+        variant.thumbnail(box, Image.LANCZOS)
+        variants.append(RecipeImageVariant(
+            recipe=recipe,
+            size=size,
+            image=save_by_hash(encode_jpeg(variant), 'recipes/variants/'),
+            width=variant.width,
+            height=variant.height,
+        ))
+    with transaction.atomic():
+        replaced = Recipe.objects.filter(
+            pk=recipe.pk, image=raw_name
+        ).update(image=name)
+        if not replaced:
+            return
+        RecipeImageVariant.objects.filter(recipe=recipe).delete()
+        RecipeImageVariant.objects.bulk_create(variants)
+        recipe_changed.send(sender=Recipe, instance=recipe)
+    if not is_referenced(raw_name):
+        default_storage.delete(raw_name)
+
+
+def is_referenced(name):
+    return (
+        Recipe.objects.filter(image=name).exists()
+        or RecipeImageVariant.objects.filter(image=name).exists()
+    )
@@ -0,0 +1,287 @@
+import bisect
+import fcntl
+import os
+import threading
+import time
+from array import array
+from contextlib import contextmanager, nullcontext
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import Ingredient, IngredientInRecipe
+
+
+class VersionedIndex:
+    """Индекс в памяти процесса, перестраиваемый по штампу версии.
+
+    Штамп хранится в кеше Django: любое изменение данных меняет его,
+    и каждый процесс, заметив новый штамп, перестраивает свою копию.
+    Чтобы изменения видели все воркеры, кеш должен быть общим.
+    """
+    version_key = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+
+    @classmethod
+    def bump_version(cls):
+        cache.set(cls.version_key, uuid4().hex, None)
+
+    @classmethod
+    def current_version(cls):
+        version = cache.get(cls.version_key)
+        if version is None:
+            cache.add(cls.version_key, uuid4().hex, None)
+            version = cache.get(cls.version_key)
+        return version
+
+    def ensure_fresh(self):
+        now = time.monotonic()
+        interval = settings.INDEX_VERSION_CHECK_INTERVAL
+        if self._version is not None and now - self._checked_at < interval:
+            return
+        with self._lock:
+            version = self.current_version()
+            if version != self._version:
+                self.build()
+                self._version = version
+            else:
+                self.apply_changes()
+            self._checked_at = now
+
+    def build(self):
+        raise NotImplementedError
+
+    def apply_changes(self):
+        """Догоняет изменения без полной перестройки, если умеет."""
+
+
+class IngredientIndex(VersionedIndex):
+    """Отсортированный массив названий ингредиентов для поиска по префиксу.
+
+    Ключи приведены через casefold(), найденные ингредиенты
+    возвращаются в порядке Ingredient.Meta.ordering. Пробелы по краям
+    префикса отбрасываются, как в CharFilter фильтра IngredientFilter.
+    """
+    version_key = 'ingredient_index:version'
+
+    def __init__(self):
+        super().__init__()
+        # (ингредиенты, ключи, позиции) заменяются одним присваиванием:
+        # search() читает их без блокировки и не должен застать
+        # ключи новой сборки рядом с ингредиентами старой.
+        self._state = ((), (), ())
+
+    def build(self):
+        items = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for pk, name, measurement_unit in Ingredient.objects.using(
+                DEFAULT_DB_ALIAS
+            ).values_list('id', 'name', 'measurement_unit')
+        )
+        entries = sorted(
+            (item['name'].casefold(), position)
+            for position, item in enumerate(items)
+        )
+        self._state = (
+            items,
+            tuple(key for key, _ in entries),
+            tuple(position for _, position in entries),
+        )
+
+    def search(self, prefix):
+        self.ensure_fresh()
+        items, keys, positions = self._state
+        prefix = prefix.strip()
+        if not prefix:
+            return list(items)
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_right(keys, prefix + chr(0x10FFFF), start)
+        return [items[position] for position in sorted(positions[start:end])]
+
+
+@contextmanager
+def file_lock(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def cache_lock(name):
+    """Блокировка для чтения с записью в кеше между процессами.
+
+    incr и add файлового кеша читают и пишут файл без блокировки,
+    поэтому их оборачивает flock на файле в каталоге кеша: файловый
+    кеш общий только для процессов одной машины. У locmem эти операции
+    и так под блокировкой.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if not isinstance(backend, FileBasedCache):
+        return nullcontext()
+    return file_lock(os.path.join(backend._dir, f'{name}.lock'))
+
+
+def intersect(small, large):
+    """Пересечение отсортированных массивов: бинарный поиск по большему."""
+    result = array('q')
+    position = 0
+    for value in small:
+        position = bisect.bisect_left(large, value, position)
+        if position == len(large):
+            break
+        if large[position] == value:
+            result.append(value)
+    return result
+
+
+def difference(values, excluded):
+    """Элементы values, которых нет в отсортированном excluded."""
+    result = array('q')
+    position = 0
+    for value in values:
+        position = bisect.bisect_left(excluded, value, position)
+        if position == len(excluded) or excluded[position] != value:
+            result.append(value)
+    return result
+
+
+def insert(values, value):
+    position = bisect.bisect_left(values, value)
+    if position == len(values) or values[position] != value:
+        values.insert(position, value)
+
+
+def remove(values, value):
+    position = bisect.bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+
+
+class RecipeIngredientIndex(VersionedIndex):
+    """Обратный индекс: ингредиент -> отсортированный массив id рецептов.
+
+    Правки рецептов передаются между процессами журналом в кеше:
+    номер последней записи хранится под sequence_key, сами записи
+    (recipe_id, added, removed) - под change_key. Если
+    запись уже вытеснена из кеша, индекс перестраивается целиком.
+    Номер выдаётся под cache_lock: два процесса с одним номером
+    затёрли бы запись друг друга.
+    """
+    version_key = 'recipe_ingredient_index:version'
+    sequence_key = 'recipe_ingredient_index:sequence'
+    change_key = 'recipe_ingredient_index:change:{}'
+    change_timeout = 24 * 60 * 60
+
+    def __init__(self):
+        super().__init__()
+        self._sequence = 0
+        self._postings = {}
+
+    @classmethod
+    def record_change(cls, recipe_id, added=(), removed=()):
+        with cache_lock(cls.sequence_key.replace(':', '_')):
+            try:
+                sequence = cache.incr(cls.sequence_key)
+            except ValueError:
+                cache.add(cls.sequence_key, 0, None)
+                sequence = cache.incr(cls.sequence_key)
+        cache.set(
+            cls.change_key.format(sequence),
+            (recipe_id, list(added), list(removed)),
+            cls.change_timeout,
+        )
+
+    def build(self):
+        # Номер читается до данных: записи, попавшие в выборку,
+        # применятся повторно, а это безопасно. Данные - из основной
+        # базы: отставшая реплика потеряла бы уже учтённые записи.
+        self._sequence = cache.get(self.sequence_key, 0)
+        postings = {}
+        for ingredient_id, recipe_id in IngredientInRecipe.objects.using(
+            DEFAULT_DB_ALIAS
+        ).order_by('ingredient_id', 'recipe_id').values_list(
+            'ingredient_id', 'recipe_id'
+        ).iterator():
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+        self._postings = postings
+
+    def apply_changes(self):
+        sequence = cache.get(self.sequence_key, 0)
+        if sequence == self._sequence:
+            return
+        if sequence < self._sequence:
+            # Счётчик вытеснен из кеша и начат заново.
+            self.build()
+            return
+        keys = [
+            self.change_key.format(number)
+            for number in range(self._sequence + 1, sequence + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            self.build()
+            return
+        # Правки идут в копии списков: их могут читать другие потоки.
+        postings = dict(self._postings)
+        copied = set()
+        for key in keys:
+            recipe_id, added, removed = changes[key]
+            for ingredient_id in set(added) | set(removed):
+                if ingredient_id not in copied:
+                    postings[ingredient_id] = array(
+                        'q', postings.get(ingredient_id, ())
+                    )
+                    copied.add(ingredient_id)
+            for ingredient_id in added:
+                insert(postings[ingredient_id], recipe_id)
+            for ingredient_id in removed:
+                remove(postings[ingredient_id], recipe_id)
+        self._postings = postings
+        self._sequence = sequence
+
+    def postings(self, ingredient_ids):
+        return [
+            self._postings.get(ingredient_id, array('q'))
+            for ingredient_id in set(ingredient_ids)
+        ]
+
+    def match(self, all_of=(), any_of=(), none_of=()):
+        """Отсортированные id рецептов со всеми all_of, хотя бы одним
+        из any_of и без none_of. Без all_of и any_of - None: вызывающий
+        сам исключает excluded(none_of)."""
+        self.ensure_fresh()
+        result = None
+        if all_of:
+            lists = sorted(self.postings(all_of), key=len)
+            result = lists[0]
+            for values in lists[1:]:
+                result = intersect(result, values)
+        if any_of:
+            union = array('q', sorted(set().union(*self.postings(any_of))))
+            result = union if result is None else intersect(
+                *sorted((result, union), key=len)
+            )
+        if result is None:
+            return None
+        for values in self.postings(none_of):
+            result = difference(result, values)
+        return result
+
+    def excluded(self, none_of):
+        self.ensure_fresh()
+        return set().union(*self.postings(none_of))
+
+
+ingredient_index = IngredientIndex()
+recipe_ingredient_index = RecipeIngredientIndex()
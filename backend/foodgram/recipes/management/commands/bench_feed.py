@@ -0,0 +1,69 @@
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count
+
+from recipes import feed
+from recipes.models import Recipe
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Compare the subscription feed inbox with a Recipe/Follow join'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--pages', type=int, default=5)
+        parser.add_argument('--page-size', type=int, default=6)
+
+    def join(self, user, position, limit):
+        recipes = Recipe.objects.filter(author__following__user=user)
+        return list(feed.after(recipes, position, 'id').order_by(
+            '-created', '-id'
+        ).values_list('id', flat=True)[:limit])
+
+    def measure(self, page_ids, users, pages, page_size):
+        """Как лента: несколько страниц подряд по курсору."""
+        timings = []
+        results = []
+        for user in users:
+            position = None
+            for _ in range(pages):
+                started = time.perf_counter()
+                ids = page_ids(user, position, page_size + 1)[:page_size]
+                recipes = Recipe.objects.in_bulk(ids)
+                timings.append(time.perf_counter() - started)
+                results.append(ids)
+                if not ids:
+                    break
+                last = recipes[ids[-1]]
+                position = (last.created, last.id)
+        timings.sort()
+        return (
+            timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95) - 1] * 1000,
+            results,
+        )
+
+    def handle(self, *args, **options):
+        users = list(User.objects.annotate(
+            follows=Count('follower')
+        ).filter(follows__gt=0).order_by('-follows')[:options['users']])
+        if not users:
+            raise CommandError('No follows in database, run generate_data!')
+        self.stdout.write(
+            f'{len(users)} users, up to {users[0].follows} follows each'
+        )
+        measured = {}
+        for title, page_ids in (('join', self.join), ('inbox', feed.page_ids)):
+            p50, p95, measured[title] = self.measure(
+                page_ids, users, options['pages'], options['page_size']
+            )
+            self.stdout.write(
+                f'{title:>5}: p50 {p50:9.2f} ms, p95 {p95:9.2f} ms'
+            )
+        if measured['join'] != measured['inbox']:
+            self.stdout.write(self.style.WARNING(
+                'Pages differ: inboxes are limited to FEED_BACKFILL_SIZE '
+                'recipes per author or need rebuild_feeds'
+            ))
@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+
+from api.filters import IngredientFilter
+from api.serializers import IngredientSerializer
+from recipes.indexes import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = 'Compare ingredient prefix search: ORM vs in-memory index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def orm_search(self, prefix):
+        queryset = IngredientFilter(
+            {'name': prefix}, queryset=Ingredient.objects.all()
+        ).qs
+        return IngredientSerializer(queryset, many=True).data
+
+    def measure(self, search, prefixes):
+        timings = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            search(prefix)
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return (
+            sum(timings) / len(timings) * 1e6,
+            timings[int(len(timings) * 0.99) - 1] * 1e6,
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('No ingredients in database!')
+        randomizer = random.Random(options['seed'])
+        prefixes = [
+            randomizer.choice(names)[:randomizer.randint(1, 4)]
+            for _ in range(options['queries'])
+        ]
+        for prefix in set(prefixes):
+            orm = [dict(item) for item in self.orm_search(prefix)]
+            if orm != ingredient_index.search(prefix):
+                self.stderr.write(f'Results differ for prefix "{prefix}"')
+        for title, search in (
+            ('orm', self.orm_search),
+            ('index', ingredient_index.search),
+        ):
+            mean, p99 = self.measure(search, prefixes)
+            self.stdout.write(
+                f'{title:>5}: mean {mean:10.1f} us, p99 {p99:10.1f} us'
+            )
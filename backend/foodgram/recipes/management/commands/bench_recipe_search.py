@@ -0,0 +1,71 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Q
+
+from recipes.models import Recipe
+from recipes.search import WORDS
+
+
+class Command(BaseCommand):
+    help = 'Compare recipe full-text search with icontains scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100)
+        parser.add_argument('--page-size', type=int, default=6)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def icontains(self, query):
+        queryset = Recipe.objects.all()
+        for word in WORDS.findall(query):
+            queryset = queryset.filter(
+                Q(name__icontains=word) | Q(text__icontains=word)
+            )
+        return queryset.order_by('-created', '-id')
+
+    def full_text(self, query):
+        return Recipe.objects.search(query)
+
+    def measure(self, search, queries, page_size):
+        """Как страница списка: COUNT(*) и первая страница."""
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            queryset = search(query)
+            queryset.count()
+            list(queryset[:page_size])
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return (
+            timings[len(timings) // 2] * 1000,
+            timings[int(len(timings) * 0.95) - 1] * 1000,
+        )
+
+    def handle(self, *args, **options):
+        total = Recipe.objects.count()
+        if not total:
+            raise CommandError('No recipes in database, run generate_data!')
+        randomizer = random.Random(options['seed'])
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first()
+        queries = []
+        while len(queries) < options['queries']:
+            recipe = Recipe.objects.filter(
+                id__gte=randomizer.randint(1, last_id)
+            ).order_by('id').values_list('name', flat=True).first()
+            words = WORDS.findall(recipe or '')
+            if words:
+                queries.append(' '.join(
+                    randomizer.sample(words, min(2, len(words)))
+                ))
+        self.stdout.write(f'{total} recipes, {len(queries)} queries')
+        for title, search in (
+            ('icontains', self.icontains),
+            ('full-text', self.full_text),
+        ):
+            p50, p95 = self.measure(search, queries, options['page_size'])
+            self.stdout.write(
+                f'{title:>9}: p50 {p50:9.2f} ms, p95 {p95:9.2f} ms'
+            )
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management import BaseCommand
+
+from recipes.trending import rebuild_scores, update_scores
+
+
+class Command(BaseCommand):
+    help = 'Update time-decayed trending scores from new interactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Drop all scores and recompute them from history',
+        )
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep updating every --interval seconds',
+        )
+        parser.add_argument('--interval', type=float, default=60.0)
+
+    def run(self, rebuild):
+        started = time.perf_counter()
+        updated = rebuild_scores() if rebuild else update_scores()
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} recipe scores '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
+
+    def handle(self, *args, **options):
+        self.run(options['rebuild'])
+        while options['loop']:
+            time.sleep(options['interval'])
+            self.run(False)
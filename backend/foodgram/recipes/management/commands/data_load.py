@@ -1,29 +1,227 @@
-from csv import DictReader
+import csv
+import json
+import re
+import time
+from io import BytesIO, StringIO
+from itertools import islice
+from pathlib import Path
 
+from django.core.files.base import ContentFile
 from django.core.management import BaseCommand, CommandError
-from recipes.models import Ingredient
+from django.db import connection, transaction
+from PIL import Image
 
-TABLES_DICT = {
-    Ingredient: ('ingredients.csv', ['name', 'measurement_unit']),
-}
+from api import caching, fragments
+from recipes.indexes import IngredientIndex, RecipeIngredientIndex
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe, Tag,
+                            TagRecipe)
+from users.models import User
+
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
+TAG_FIELDS = ('name', 'color', 'slug')
+READ_SIZE = 64 * 1024
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def iter_json_array(json_file):
+    """Потоково читает элементы JSON-массива, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = json_file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('JSON file must contain an array!')
+    position = 1
+    eof = False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise CommandError('Invalid JSON file!')
+            chunk = json_file.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+        else:
+            yield item
+
+
+def iter_rows(path, fields):
+    """Кортежи значений fields из CSV (с заголовком или без) или JSON."""
+    with open(path, encoding='utf-8') as data_file:
+        if Path(path).suffix == '.json':
+            for item in iter_json_array(data_file):
+                yield tuple(str(item[field]).strip() for field in fields)
+            return
+        reader = csv.reader(data_file)
+        for row in reader:
+            row = tuple(value.strip() for value in row[:len(fields)])
+            if row == fields or not any(row):
+                continue
+            yield row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def placeholder_image(name):
+    buffer = BytesIO()
+    Image.new('RGB', (600, 400), (236, 230, 220)).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name=f'{name}.jpg')
 
 
 class Command(BaseCommand):
-    help = 'Load data from csv files'
+    help = 'Load ingredients, tags and sample recipes from csv/json files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'ingredients', nargs='?', default='./ingredients.csv',
+            help='Ingredients file, .csv or .json',
+        )
+        parser.add_argument('--tags', help='Tags file, .csv or .json')
+        parser.add_argument('--recipes', help='Sample recipes .json file')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def report(self, title, read, inserted, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: read {read}, inserted {inserted} '
+            f'in {elapsed:.2f} s ({read / max(elapsed, 1e-9):.0f} rows/s)'
+        ))
+
+    def copy_ingredients(self, chunks):
+        """PostgreSQL: COPY во временную таблицу и один INSERT без дублей."""
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        read = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            for chunk in chunks:
+                buffer = StringIO()
+                csv.writer(buffer).writerows(chunk)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+                read += len(chunk)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit, created) '
+                f'SELECT DISTINCT name, measurement_unit, now() '
+                f'FROM ingredient_staging '
+                f'ON CONFLICT (name, measurement_unit) DO NOTHING'
+            )
+            return read, cursor.rowcount
+
+    def bulk_create_ingredients(self, chunks):
+        read = 0
+        before = Ingredient.objects.count()
+        with transaction.atomic():
+            for chunk in chunks:
+                Ingredient.objects.bulk_create(
+                    [Ingredient(name=name, measurement_unit=unit)
+                     for name, unit in chunk],
+                    ignore_conflicts=True,
+                )
+                read += len(chunk)
+        return read, Ingredient.objects.count() - before
+
+    def load_ingredients(self, path, chunk_size):
+        started = time.perf_counter()
+        chunks = chunked(iter_rows(path, INGREDIENT_FIELDS), chunk_size)
+        if connection.vendor == 'postgresql':
+            read, inserted = self.copy_ingredients(chunks)
+        else:
+            read, inserted = self.bulk_create_ingredients(chunks)
+        IngredientIndex.bump_version()
+        self.report('Ingredients', read, inserted, started)
+
+    def load_tags(self, path, chunk_size):
+        started = time.perf_counter()
+        read = 0
+        before = Tag.objects.count()
+        for chunk in chunked(iter_rows(path, TAG_FIELDS), chunk_size):
+            Tag.objects.bulk_create(
+                [Tag(name=name, color=color, slug=slug)
+                 for name, color, slug in chunk],
+                ignore_conflicts=True,
+            )
+            read += len(chunk)
+        self.report('Tags', read, Tag.objects.count() - before, started)
+
+    @transaction.atomic
+    def create_recipe(self, data):
+        author_data = data['author']
+        author, created = User.objects.get_or_create(
+            email=author_data['email'],
+            defaults={
+                'username': author_data['username'],
+                'first_name': author_data['first_name'],
+                'last_name': author_data['last_name'],
+            },
+        )
+        if created:
+            author.set_unusable_password()
+            author.save(update_fields=('password',))
+        if Recipe.objects.filter(author=author, name=data['name']).exists():
+            return False
+        recipe = Recipe.objects.create(
+            author=author,
+            name=data['name'],
+            text=data['text'],
+            cooking_time=data['cooking_time'],
+            image=placeholder_image(f'sample_{author.id}'),
+        )
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag=tag, recipe=recipe)
+            for tag in Tag.objects.filter(slug__in=data['tags'])
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                ingredient=Ingredient.objects.get_or_create(
+                    name=item['name'],
+                    measurement_unit=item['measurement_unit'],
+                )[0],
+                recipe=recipe,
+                amount=item['amount'],
+            )
+            for item in data['ingredients']
+        )
+        return True
+
+    def load_recipes(self, path):
+        started = time.perf_counter()
+        read = inserted = 0
+        with open(path, encoding='utf-8') as recipes_file:
+            for data in iter_json_array(recipes_file):
+                read += 1
+                inserted += self.create_recipe(data)
+        RecipeIngredientIndex.bump_version()
+        self.report('Recipes', read, inserted, started)
 
     def handle(self, *args, **options):
-        for model, parameters in TABLES_DICT.items():
-            if model.objects.exists():
-                raise CommandError('Data exists in database!')
-            with open(
-                    f'./{parameters[0]}',
-                    encoding='utf-8'
-            ) as csv_file:
-                reader = DictReader(csv_file)
-                data = []
-                for row in reader:
-                    data.append(model(
-                        **dict(zip(parameters[1], row.values()))
-                    ))
-                model.objects.bulk_create(data)
+        for path in (options['ingredients'], options['tags'],
+                     options['recipes']):
+            if path and not Path(path).is_file():
+                raise CommandError(f'File {path} not found!')
+        self.load_ingredients(options['ingredients'], options['chunk_size'])
+        if options['tags']:
+            self.load_tags(options['tags'], options['chunk_size'])
+        if options['recipes']:
+            self.load_recipes(options['recipes'])
+        # bulk_create не шлёт сигналов, кешированные ответы сбрасываются.
+        caching.bump_generation()
+        fragments.bump_generation()
         self.stdout.write(self.style.SUCCESS('Successfully load data'))
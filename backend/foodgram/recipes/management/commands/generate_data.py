@@ -0,0 +1,249 @@
+import random
+import time
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, CommandError, call_command
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api import caching, fragments
+from recipes.indexes import RecipeIngredientIndex
+from recipes.management.commands.data_load import placeholder_image
+from recipes.models import (Favourite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Tag, TagRecipe)
+from users.models import Follow, User
+
+WORDS = (
+    'суп', 'салат', 'пирог', 'рагу', 'омлет', 'каша', 'паста', 'запеканка',
+    'томатный', 'грибной', 'куриный', 'овощной', 'сырный', 'домашний',
+    'быстрый', 'пряный', 'летний', 'зимний', 'бабушкин', 'острый',
+)
+
+
+class Skewed:
+    """Выбор из population с вероятностью ~ 1 / rank ** exponent (Zipf)."""
+
+    def __init__(self, randomizer, population, exponent):
+        self.randomizer = randomizer
+        self.population = list(population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent
+            for rank in range(1, len(self.population) + 1)
+        ))
+
+    def choice(self):
+        return self.randomizer.choices(
+            self.population, cum_weights=self.cum_weights
+        )[0]
+
+    def sample(self, k):
+        """До k различных элементов, популярные выпадают чаще."""
+        k = min(k, len(self.population))
+        chosen = set()
+        for _ in range(k * 10):
+            if len(chosen) == k:
+                break
+            chosen.update(self.randomizer.choices(
+                self.population, cum_weights=self.cum_weights,
+                k=k - len(chosen),
+            ))
+        return chosen
+
+
+class Command(BaseCommand):
+    help = 'Generate a synthetic dataset with realistic popularity skew'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=12)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, nargs=2, default=(3, 12),
+            metavar=('MIN', 'MAX'),
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Mean favorites per user',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Mean shopping cart recipes per user',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Mean subscriptions per user',
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Zipf exponent for authors, recipes and ingredients',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='gen')
+        parser.add_argument('--password', default='password')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def report(self, title, count, started):
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: {count} in {time.perf_counter() - started:.2f} s'
+        ))
+
+    def bulk_create(self, model, objects, ignore_conflicts=False):
+        """Вставляет объекты пачками, не держа в памяти весь набор."""
+        started = time.perf_counter()
+        objects = iter(objects)
+        count = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            # Django 2.2 не ограничивает явный batch_size лимитами SQLite.
+            model.objects.bulk_create(
+                batch,
+                batch_size=connection.ops.bulk_batch_size(
+                    model._meta.concrete_fields, batch
+                ),
+                ignore_conflicts=ignore_conflicts,
+            )
+            count += len(batch)
+        self.report(model._meta.verbose_name_plural, count, started)
+
+    def new_ids(self, model, objects, ignore_conflicts=False):
+        """Создаёт объекты и возвращает id новых строк по порядку."""
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        self.bulk_create(model, objects, ignore_conflicts)
+        return list(model.objects.filter(
+            id__gt=last_id
+        ).order_by('id').values_list('id', flat=True))
+
+    def per_user(self, mean):
+        """Число связей пользователя: экспоненциальное, с длинным хвостом."""
+        if mean <= 0:
+            return 0
+        return int(self.randomizer.expovariate(1 / mean))
+
+    def create_users(self, count, prefix, password):
+        start = User.objects.filter(username__startswith=prefix).count()
+        password = make_password(password)
+        return self.new_ids(User, [
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(start, start + count)
+        ])
+
+    def create_tags(self, count, prefix):
+        self.bulk_create(Tag, [
+            Tag(
+                name=f'Тег {number}',
+                color=f'#{self.randomizer.getrandbits(24):06x}',
+                slug=f'{prefix}-tag-{number}',
+            )
+            for number in range(count)
+        ], ignore_conflicts=True)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_recipes(self, count, authors, prefix):
+        image = default_storage.save(
+            f'recipes/{prefix}.jpg', placeholder_image(prefix)
+        )
+        return self.new_ids(Recipe, (
+            Recipe(
+                name=' '.join(
+                    self.randomizer.sample(WORDS, 3) + [str(number)]
+                ).capitalize(),
+                author_id=authors.choice(),
+                text=' '.join(self.randomizer.choices(WORDS, k=30)),
+                image=image,
+                cooking_time=self.randomizer.randint(5, 180),
+            )
+            for number in range(count)
+        ))
+
+    def create_links(self, recipe_ids, tag_ids, ingredients, bounds):
+        self.bulk_create(TagRecipe, (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.randomizer.sample(
+                tag_ids, min(len(tag_ids), self.randomizer.randint(1, 3))
+            )
+        ))
+        self.bulk_create(IngredientInRecipe, (
+            IngredientInRecipe(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.randomizer.randint(1, 50) * 10,
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in ingredients.sample(
+                self.randomizer.randint(*bounds)
+            )
+        ))
+
+    def create_user_links(self, model, user_ids, targets, mean, field):
+        self.bulk_create(model, (
+            model(user_id=user_id, **{field: target_id})
+            for user_id in user_ids
+            for target_id in targets.sample(self.per_user(mean))
+            if not (model is Follow and target_id == user_id)
+        ), ignore_conflicts=True)
+
+    @transaction.atomic
+    def generate(self, options):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('No ingredients in database, run data_load!')
+        exponent = options['skew']
+        user_ids = self.create_users(
+            options['users'], options['prefix'], options['password']
+        )
+        tag_ids = self.create_tags(options['tags'], options['prefix'])
+        # Популярные авторы и пишут больше, и собирают больше подписчиков.
+        authors = Skewed(
+            self.randomizer,
+            self.randomizer.sample(user_ids, len(user_ids)),
+            exponent,
+        )
+        recipe_ids = self.create_recipes(
+            options['recipes'], authors, options['prefix']
+        )
+        self.randomizer.shuffle(ingredient_ids)
+        self.create_links(
+            recipe_ids, tag_ids,
+            Skewed(self.randomizer, ingredient_ids, exponent),
+            options['ingredients_per_recipe'],
+        )
+        recipes = Skewed(
+            self.randomizer,
+            self.randomizer.sample(recipe_ids, len(recipe_ids)),
+            exponent,
+        )
+        self.create_user_links(
+            Favourite, user_ids, recipes, options['favorites'], 'recipe_id'
+        )
+        self.create_user_links(
+            ShoppingCart, user_ids, recipes, options['carts'], 'recipe_id'
+        )
+        self.create_user_links(
+            Follow, user_ids, authors, options['follows'], 'author_id'
+        )
+        call_command('shopping_cart_totals', 'rebuild', stdout=self.stdout)
+        call_command('reconcile_counters', 'repair', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+
+    def handle(self, *args, **options):
+        self.randomizer = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+        self.generate(options)
+        RecipeIngredientIndex.bump_version()
+        caching.bump_generation()
+        fragments.bump_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Dataset generated in {time.perf_counter() - started:.2f} s'
+        ))
@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+from multiprocessing import Process
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+
+from recipes.images import process_recipe_image
+from recipes.models import ImageJob
+
+
+class Command(BaseCommand):
+    help = 'Run worker processes for the recipe image queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the queue is empty',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+
+    def requeue_stale(self):
+        ImageJob.objects.filter(
+            status=ImageJob.PROCESSING,
+            updated__lt=timezone.now() - timedelta(
+                seconds=settings.IMAGE_JOB_TIMEOUT
+            ),
+        ).update(status=ImageJob.PENDING)
+
+    def claim(self):
+        """Забирает задачу условным UPDATE, чтобы не делить её с соседями."""
+        for job in ImageJob.objects.filter(
+            status=ImageJob.PENDING
+        ).select_related('recipe')[:10]:
+            claimed = ImageJob.objects.filter(
+                pk=job.pk, status=ImageJob.PENDING
+            ).update(
+                status=ImageJob.PROCESSING,
+                attempts=F('attempts') + 1,
+                updated=timezone.now(),
+            )
+            if claimed:
+                job.attempts += 1
+                return job
+        return None
+
+    def run_job(self, job):
+        if ImageJob.objects.filter(
+            recipe_id=job.recipe_id, pk__gt=job.pk
+        ).exists():
+            job.status = ImageJob.DONE
+        else:
+            try:
+                process_recipe_image(job.recipe)
+                job.status = ImageJob.DONE
+            except Exception as error:
+                job.error = repr(error)
+                job.status = (
+                    ImageJob.FAILED
+                    if job.attempts >= settings.IMAGE_JOB_MAX_ATTEMPTS
+                    else ImageJob.PENDING
+                )
+        job.save(update_fields=('status', 'error', 'updated'))
+
+    def work(self, once, poll_interval):
+        while True:
+            self.requeue_stale()
+            job = self.claim()
+            if job is not None:
+                self.run_job(job)
+                continue
+            if once:
+                return
+            time.sleep(poll_interval)
+
+    def handle(self, *args, **options):
+        if options['workers'] <= 1:
+            self.work(options['once'], options['poll_interval'])
+            return
+        connections.close_all()
+        workers = [
+            Process(
+                target=self.work,
+                args=(options['once'], options['poll_interval']),
+            )
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes import feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild subscription feed inboxes from follows'
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            created = feed.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {created} feed entries '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,37 @@
+from django.apps import apps
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes import counters
+
+
+class Command(BaseCommand):
+    help = 'Verify or repair denormalized favorite, cart and recipe counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('verify', 'repair'))
+
+    def verify(self):
+        total = 0
+        for model, counter, source, field in counters.COUNTERS:
+            rows = counters.drifted(apps, model, counter, source, field)
+            for row in rows.values('pk', counter, 'actual')[:20]:
+                self.stdout.write(
+                    f'{model} {row["pk"]}: {counter} '
+                    f'stored {row[counter]}, expected {row["actual"]}'
+                )
+            total += rows.count()
+        if total:
+            raise CommandError(f'{total} counters are out of sync!')
+        self.stdout.write(self.style.SUCCESS('All counters are in sync'))
+
+    @transaction.atomic
+    def repair(self):
+        for model, counter, source, field in counters.COUNTERS:
+            repaired = counters.repair(apps, model, counter, source, field)
+            self.stdout.write(self.style.SUCCESS(
+                f'{model}.{counter}: repaired {repaired} rows'
+            ))
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])()
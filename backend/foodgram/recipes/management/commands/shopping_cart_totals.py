@@ -0,0 +1,90 @@
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import ShoppingCart, ShoppingCartTotal
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Verify or rebuild materialized shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=('verify', 'rebuild'))
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='Limit to this user id (may be repeated)',
+        )
+
+    def filter_users(self, queryset, users):
+        if users:
+            return queryset.filter(user_id__in=users)
+        return queryset.all()
+
+    def expected_totals(self, users):
+        rows = self.filter_users(ShoppingCart.objects, users).filter(
+            recipe__ingredients_recipes__isnull=False
+        ).values(
+            'user_id', 'recipe__ingredients_recipes__ingredient_id'
+        ).annotate(
+            total=Sum('recipe__ingredients_recipes__amount')
+        ).order_by()
+        for row in rows.iterator():
+            yield (
+                row['user_id'],
+                row['recipe__ingredients_recipes__ingredient_id'],
+                row['total'],
+            )
+
+    def verify(self, users):
+        expected = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in self.expected_totals(users)
+        }
+        actual = dict(
+            ((user_id, ingredient_id), amount)
+            for user_id, ingredient_id, amount in self.filter_users(
+                ShoppingCartTotal.objects, users
+            ).values_list('user_id', 'ingredient_id', 'amount').iterator()
+        )
+        drift = [
+            key for key in expected.keys() | actual.keys()
+            if expected.get(key) != actual.get(key)
+        ]
+        for user_id, ingredient_id in sorted(drift)[:20]:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'expected {expected.get((user_id, ingredient_id))}, '
+                f'stored {actual.get((user_id, ingredient_id))}'
+            )
+        if drift:
+            raise CommandError(f'{len(drift)} totals are out of sync!')
+        self.stdout.write(self.style.SUCCESS(
+            f'All {len(expected)} totals are in sync'
+        ))
+
+    @transaction.atomic
+    def rebuild(self, users):
+        self.filter_users(ShoppingCartTotal.objects, users).delete()
+        totals = (
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for user_id, ingredient_id, amount in self.expected_totals(users)
+        )
+        created = 0
+        while True:
+            batch = list(islice(totals, BATCH_SIZE))
+            if not batch:
+                break
+            ShoppingCartTotal.objects.bulk_create(batch)
+            created += len(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt {created} totals'
+        ))
+
+    def handle(self, *args, **options):
+        getattr(self, options['action'])(options['users'])
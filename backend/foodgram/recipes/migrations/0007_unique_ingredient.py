@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:57
+from itertools import groupby
+from operator import attrgetter
+
+from django.db import migrations, models
+
+
+def merge_rows(model, owner, keep_id, ingredient_ids):
+    """Переводит строки дублей на keep_id, складывая количества
+    строк одного владельца (рецепта или пользователя)."""
+    rows = model.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).order_by(owner, 'id')
+    for _, group in groupby(rows, key=attrgetter(owner)):
+        survivor, *extra = sorted(
+            group, key=lambda row: (row.ingredient_id != keep_id, row.id)
+        )
+        if extra:
+            model.objects.filter(id__in=[row.id for row in extra]).delete()
+        survivor.amount += sum(row.amount for row in extra)
+        survivor.ingredient_id = keep_id
+        survivor.save(update_fields=('ingredient', 'amount'))
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей в один,
+    с наименьшим id: старый загрузчик и админка допускали дубли."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        count=models.Count('id'), keep_id=models.Min('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        ingredient_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).values_list('id', flat=True))
+        for model, owner in (
+            (IngredientInRecipe, 'recipe_id'),
+            (ShoppingCartTotal, 'user_id'),
+        ):
+            merge_rows(model, owner, duplicate['keep_id'], ingredient_ids)
+        Ingredient.objects.filter(id__in=ingredient_ids).exclude(
+            id=duplicate['keep_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_image_pipeline'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
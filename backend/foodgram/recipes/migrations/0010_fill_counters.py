@@ -0,0 +1,28 @@
+from django.db import migrations
+
+from recipes import counters
+
+
+# Счётчики, существующие на момент миграции.
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favourite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for counter in COUNTERS:
+        counters.repair(apps, *counter)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_counters'),
+        ('users', '0002_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 21:00
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_feed'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredient',
+            options={'ordering': ['name', 'measurement_unit'], 'verbose_name': ('Ингридиент',), 'verbose_name_plural': 'Ингридиенты'},
+        ),
+    ]
@@ -1,9 +1,15 @@
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import UniqueConstraint
+from django.db import connection, models
+from django.db.models import (BooleanField, Case, Exists, F, IntegerField,
+                              OuterRef, Prefetch, Q, Subquery,
+                              UniqueConstraint, Value, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 
 from users.models import User
 
+from . import search
+
 
 class CreatedModel(models.Model):
     created = models.DateTimeField(
@@ -53,9 +59,125 @@ class Ingredient(CreatedModel):
         return self.name
 
     class Meta:
-        ordering = ['name', ]
+        ordering = ['name', 'measurement_unit']
         verbose_name = 'Ингридиент',
         verbose_name_plural = 'Ингридиенты'
+        constraints = [
+            UniqueConstraint(fields=['name', 'measurement_unit'],
+                             name='unique_ingredient')
+        ]
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты с количеством."""
+        return self.select_related('author').prefetch_related(
+            'image_variants',
+            Prefetch(
+                'tag_recipes',
+                queryset=TagRecipe.objects.select_related('tag'),
+            ),
+            Prefetch(
+                'ingredients_recipes',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name'),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart."""
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favourite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def with_ingredients(self, all_of=(), any_of=(), none_of=()):
+        """Рецепты со всеми all_of, хотя бы одним из any_of и без none_of."""
+        recipe_ids = IngredientInRecipe.objects.values('recipe_id')
+        queryset = self
+        for ingredient_id in set(all_of):
+            queryset = queryset.filter(
+                id__in=recipe_ids.filter(ingredient_id=ingredient_id)
+            )
+        if any_of:
+            queryset = queryset.filter(
+                id__in=recipe_ids.filter(ingredient_id__in=any_of)
+            )
+        if none_of:
+            # NOT EXISTS, а не NOT IN: PostgreSQL строит анти-соединение.
+            queryset = queryset.annotate(has_excluded_ingredient=Exists(
+                recipe_ids.filter(
+                    recipe_id=OuterRef('pk'), ingredient_id__in=none_of
+                )
+            )).filter(has_excluded_ingredient=False)
+        return queryset
+
+    def search(self, query):
+        """Полнотекстовый поиск, лучшие совпадения первыми."""
+        table = self.model._meta.db_table
+        if connection.vendor == 'postgresql':
+            params = (query, query)
+            queryset = self.extra(
+                where=[f'{table}.search_vector @@ {search.POSTGRES_QUERY}'],
+                params=params,
+            )
+            rank = RawSQL(
+                f'ts_rank({table}.search_vector, {search.POSTGRES_QUERY})',
+                params,
+            ).desc()
+        elif connection.vendor == 'sqlite':
+            match = search.fts5_query(query)
+            if not match:
+                return self.none()
+            # Соединение с FTS5, а не подзапрос: один MATCH на весь поиск.
+            queryset = self.extra(
+                tables=['recipes_recipe_fts'],
+                where=[
+                    f'recipes_recipe_fts.rowid = {table}.id',
+                    'recipes_recipe_fts MATCH %s',
+                ],
+                params=(match,),
+            )
+            rank = RawSQL(search.SQLITE_RANK, ()).asc()
+        else:
+            return self.filter(
+                Q(name__icontains=query) | Q(text__icontains=query)
+            )
+        # Ранг только в ORDER BY, чтобы COUNT(*) его не вычислял.
+        return queryset.order_by(rank, '-created', '-id')
+
+    def limited_per_author(self, limit):
+        """Оставляет не больше limit последних рецептов каждого автора."""
+        if not connection.features.supports_over_clause:
+            return self.filter(id__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).values('id')[:limit]
+            ))
+        ranked = self.order_by().annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('created').desc(), F('id').desc()],
+            )
+        ).values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.recipe_rank <= %s',
+            params + (limit,)
+        ))
 
 
 class Recipe(CreatedModel):
@@ -90,9 +212,34 @@ class Recipe(CreatedModel):
         validators=[MinValueValidator(1)],
         verbose_name='Время приготовления',
     )
+    favorites_count = models.IntegerField(
+        default=0,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.IntegerField(
+        default=0,
+        verbose_name='В корзинах',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['-created', '-id'], name='recipe_created_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'], name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['cooking_time', 'id'], name='recipe_cooking_time_idx'
+            ),
+            models.Index(
+                fields=['author', '-created', '-id'],
+                name='recipe_author_created_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -153,7 +300,7 @@ class IngredientInRecipe(CreatedModel):
                 f'для приготовления блюда {self.recipe}')
 
 
-class Favourite(models.Model):
+class Favourite(CreatedModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -169,6 +316,9 @@ class Favourite(models.Model):
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        indexes = [
+            models.Index(fields=['created'], name='favourite_created_idx'),
+        ]
         constraints = [
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_favorites')
@@ -178,7 +328,7 @@ class Favourite(models.Model):
         return f'{self.user} добавил "{self.recipe}" в Избранное'
 
 
-class ShoppingCart(models.Model):
+class ShoppingCart(CreatedModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -194,6 +344,11 @@ class ShoppingCart(models.Model):
     class Meta:
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Корзина покупок'
+        indexes = [
+            models.Index(
+                fields=['created'], name='shopping_cart_created_idx'
+            ),
+        ]
         constraints = [
             UniqueConstraint(fields=['user', 'recipe'],
                              name='unique_shopping_cart')
@@ -201,3 +356,232 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Корзину покупок'
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+
+    def apply_deltas(self, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: amount} к итогам пользователей.
+
+        Недостающие строки создаются с нулём, затем все итоги
+        обновляются одним UPDATE через F(), обнулившиеся удаляются.
+        """
+        deltas = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items() if delta
+        }
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        self.bulk_create(
+            [ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, delta in deltas.items() if delta > 0],
+            ignore_conflicts=True,
+        )
+        totals = self.filter(user_id__in=user_ids, ingredient_id__in=deltas)
+        totals.update(amount=F('amount') + Case(
+            *[When(ingredient_id=ingredient_id, then=Value(delta))
+              for ingredient_id, delta in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        totals.filter(amount__lte=0).delete()
+
+    def add_recipe(self, user_ids, recipe, sign=1):
+        """Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта."""
+        self.apply_deltas(user_ids, {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientInRecipe.objects.filter(
+                recipe=recipe
+            ).values_list('ingredient_id', 'amount')
+        })
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Объём',
+    )
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Итог корзины покупок'
+        verbose_name_plural = 'Итоги корзин покупок'
+        constraints = [
+            UniqueConstraint(fields=['user', 'ingredient'],
+                             name='unique_shopping_cart_total')
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.amount}'
+
+
+class ImageJob(CreatedModel):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_jobs',
+        verbose_name='Рецепт',
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=STATUSES,
+        default=PENDING,
+        db_index=True,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попытки',
+    )
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Обработка картинки'
+        verbose_name_plural = 'Обработка картинок'
+
+    def __str__(self):
+        return f'Картинка рецепта {self.recipe_id}: {self.status}'
+
+
+class RecipeImageVariant(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+        verbose_name='Рецепт',
+    )
+    size = models.CharField(max_length=16, verbose_name='Размер')
+    image = models.ImageField(
+        upload_to='recipes/variants/',
+        verbose_name='Картинка',
+    )
+    width = models.PositiveIntegerField(verbose_name='Ширина')
+    height = models.PositiveIntegerField(verbose_name='Высота')
+
+    class Meta:
+        ordering = ['size']
+        verbose_name = 'Вариант картинки'
+        verbose_name_plural = 'Варианты картинок'
+        constraints = [
+            UniqueConstraint(fields=['recipe', 'size'],
+                             name='unique_recipe_image_variant')
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ({self.size})'
+
+
+class RecipeScore(models.Model):
+    """Рейтинг популярности рецепта с экспоненциальным затуханием.
+
+    Хранится как сумма w * exp(ln2 * (t - epoch) / half_life) по
+    добавлениям в избранное и корзину: порядок по такой сумме совпадает
+    с порядком по затухшему к текущему моменту рейтингу.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+    )
+    score = models.FloatField(default=0, verbose_name='Рейтинг')
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=['-score'], name='recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.3f}'
+
+
+class TrendingState(models.Model):
+    """Единственная строка: точка отсчёта рейтингов и обработанный период."""
+    epoch = models.DateTimeField(verbose_name='Точка отсчёта')
+    processed_until = models.DateTimeField(
+        verbose_name='Обработано до',
+    )
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
+
+    def __str__(self):
+        return f'{self.epoch} - {self.processed_until}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, раскладывается при публикации.
+
+    created копирует дату рецепта: по ней лента листается курсором.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    created = models.DateTimeField(verbose_name='Дата рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            UniqueConstraint(fields=['user', 'recipe'],
+                             name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-created', '-recipe'],
+                name='feed_entry_user_created_idx',
+            ),
+            models.Index(
+                fields=['user', 'author'], name='feed_entry_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user}: {self.recipe_id}'
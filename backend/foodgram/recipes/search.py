@@ -0,0 +1,127 @@
+"""Полнотекстовый индекс рецептов по названию и описанию.
+
+PostgreSQL: колонка search_vector (русская и английская конфигурации,
+название с весом A, описание с весом B), GIN-индекс и триггер.
+SQLite: внешняя FTS5-таблица recipes_recipe_fts и триггеры.
+Колонка и таблица не описаны в моделях и создаются миграцией.
+"""
+import re
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}text, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce({row}text, '')), 'B')"
+)
+POSTGRES_QUERY = (
+    "(websearch_to_tsquery('russian', %s) || "
+    "websearch_to_tsquery('english', %s))"
+)
+
+POSTGRES_INSTALL = (
+    'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector',
+    'CREATE INDEX recipe_search_vector_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+    'CREATE FUNCTION recipes_recipe_search_vector() RETURNS trigger AS $$ '
+    'BEGIN NEW.search_vector := ' + POSTGRES_VECTOR.format(row='NEW.')
+    + '; RETURN NEW; END $$ LANGUAGE plpgsql',
+    'CREATE TRIGGER recipes_recipe_search_vector '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_vector()',
+    'UPDATE recipes_recipe SET search_vector = '
+    + POSTGRES_VECTOR.format(row=''),
+)
+POSTGRES_UNINSTALL = (
+    'DROP TRIGGER recipes_recipe_search_vector ON recipes_recipe',
+    'DROP FUNCTION recipes_recipe_search_vector()',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector',
+)
+
+SQLITE_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5('
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+SQLITE_TRIGGERS = (
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert '
+    'AFTER INSERT ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete '
+    'AFTER DELETE ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); END",
+    'CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update '
+    'AFTER UPDATE OF name, text ON recipes_recipe BEGIN '
+    'INSERT INTO recipes_recipe_fts (recipes_recipe_fts, rowid, name, text) '
+    "VALUES ('delete', old.id, old.name, old.text); "
+    'INSERT INTO recipes_recipe_fts (rowid, name, text) '
+    'VALUES (new.id, new.name, new.text); END',
+)
+SQLITE_TRIGGER_NAMES = {
+    'recipes_recipe_fts_insert',
+    'recipes_recipe_fts_delete',
+    'recipes_recipe_fts_update',
+}
+SQLITE_REBUILD = (
+    "INSERT INTO recipes_recipe_fts (recipes_recipe_fts) VALUES ('rebuild')"
+)
+SQLITE_UNINSTALL = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+# Вес названия и описания в bm25, как A и B в PostgreSQL.
+SQLITE_RANK = 'bm25(recipes_recipe_fts, 10.0, 1.0)'
+
+WORDS = re.compile(r'\w+')
+
+
+def fts5_query(query):
+    """Слова запроса как префиксы FTS5, без операторов пользователя."""
+    return ' '.join(f'"{word}"*' for word in WORDS.findall(query))
+
+
+def install(connection):
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_INSTALL
+    elif connection.vendor == 'sqlite':
+        statements = (SQLITE_TABLE,) + SQLITE_TRIGGERS + (SQLITE_REBUILD,)
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(connection):
+    statements = {
+        'postgresql': POSTGRES_UNINSTALL,
+        'sqlite': SQLITE_UNINSTALL,
+    }.get(connection.vendor, ())
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def repair_sqlite_triggers(connection):
+    """Возвращает триггеры FTS5 после пересоздания таблицы рецептов.
+
+    SQLite меняет схему, копируя таблицу, и её триггеры при этом
+    удаляются, поэтому после миграций они создаются заново,
+    а индекс перестраивается.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE name LIKE 'recipes_recipe_fts%'"
+        )
+        existing = {name for name, in cursor.fetchall()}
+        if ('recipes_recipe_fts' not in existing
+                or SQLITE_TRIGGER_NAMES <= existing):
+            return
+        for statement in SQLITE_TRIGGERS + (SQLITE_REBUILD,):
+            cursor.execute(statement)
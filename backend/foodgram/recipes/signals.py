@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete)
+from django.dispatch import Signal, receiver
+
+from users.models import User
+from . import feed
+from .indexes import IngredientIndex, RecipeIngredientIndex
+from .models import Ingredient, Recipe, ShoppingCartTotal
+from .search import repair_sqlite_triggers
+
+# Правка рецепта в обход save(): update() и bulk_create() не шлют
+# post_save, а кеши ответов должны о ней узнать.
+recipe_changed = Signal(providing_args=['instance'])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    IngredientIndex.bump_version()
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    ShoppingCartTotal.objects.add_recipe(
+        instance.shopping_cart.values_list('user_id', flat=True),
+        instance,
+        sign=-1,
+    )
+    if settings.RECIPE_INGREDIENT_INDEX_ENABLED:
+        recipe_id = instance.id
+        removed = list(instance.ingredients_recipes.values_list(
+            'ingredient_id', flat=True
+        ))
+        transaction.on_commit(lambda: RecipeIngredientIndex.record_change(
+            recipe_id, removed=removed
+        ))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        User.objects.filter(id=instance.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        feed.fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_removed(sender, instance, **kwargs):
+    User.objects.filter(id=instance.author_id).update(
+        recipes_count=F('recipes_count') - 1
+    )
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Избранное и корзина удалятся каскадом, минуя счётчики рецептов.
+    Recipe.objects.filter(favorites__user=instance).update(
+        favorites_count=F('favorites_count') - 1
+    )
+    Recipe.objects.filter(shopping_cart__user=instance).update(
+        in_carts_count=F('in_carts_count') - 1
+    )
+    User.objects.filter(following__user=instance).update(
+        followers_count=F('followers_count') - 1
+    )
+
+
+@receiver(post_migrate)
+def recipes_migrated(sender, using, **kwargs):
+    if sender.name == 'recipes':
+        repair_sqlite_triggers(connections[using])
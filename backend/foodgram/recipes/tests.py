@@ -0,0 +1,210 @@
+import math
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from users.models import User
+
+from .checks import INDEX_SETTINGS, index_cache_check
+from .images import process_recipe_image
+from .indexes import IngredientIndex
+from .models import (Favourite, Ingredient, Recipe, RecipeImageVariant,
+                     RecipeScore, ShoppingCart, TrendingState)
+from .trending import decay_rate
+
+
+class ImageProcessingTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        author = User.objects.create(
+            email='cook@example.com', username='cook',
+            first_name='Повар', last_name='Тестовый',
+        )
+        buffer = BytesIO()
+        Image.new('RGB', (300, 200), (200, 10, 10)).save(buffer, 'PNG')
+        # Как в generate_data: один исходный файл у нескольких рецептов.
+        self.raw_name = default_storage.save(
+            'recipes/raw.png', ContentFile(buffer.getvalue())
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', image=self.raw_name,
+                text='Описание', cooking_time=10,
+            )
+            for number in range(2)
+        ]
+
+    def test_shared_files_are_kept(self):
+        first, second = self.recipes
+        process_recipe_image(first)
+        first.refresh_from_db()
+        self.assertTrue(default_storage.exists(self.raw_name))
+        self.assertTrue(RecipeImageVariant.objects.filter(
+            recipe=first
+        ).exists())
+
+        process_recipe_image(second)
+        second.refresh_from_db()
+        self.assertFalse(default_storage.exists(self.raw_name))
+        self.assertEqual(second.image.name, first.image.name)
+
+        # Повторная задача для уже обработанного рецепта ничего не трогает.
+        variants = list(RecipeImageVariant.objects.filter(
+            recipe=first
+        ).values_list('image', flat=True))
+        process_recipe_image(first)
+        first.refresh_from_db()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(default_storage.exists(first.image.name))
+        for name in variants:
+            self.assertTrue(default_storage.exists(name))
+
+
+@override_settings(TRENDING_HALF_LIFE=1)
+class TrendingTestCase(TestCase):
+    # Модель, пользователь, рецепт, сколько часов назад.
+    before_first_run = (
+        (Favourite, 0, 0, 5), (Favourite, 1, 0, 4),
+        (ShoppingCart, 0, 1, 4.5),
+        # Моложе TRENDING_LAG первого запуска: войдёт во второй.
+        (Favourite, 2, 1, 1),
+    )
+    before_second_run = (
+        (Favourite, 0, 2, 2), (ShoppingCart, 1, 0, 0.5),
+        (ShoppingCart, 2, 2, 1.5),
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                email=f'user{number}@example.com', username=f'user{number}',
+                first_name='Пользователь', last_name='Тестовый',
+            )
+            for number in range(3)
+        ]
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.users[0], name=f'Рецепт {number}',
+                image='recipes/test.png', text='Описание', cooking_time=10,
+            )
+            for number in range(3)
+        ]
+
+    def add_events(self, events):
+        now = timezone.now()
+        for model, user, recipe, hours in events:
+            event = model.objects.create(
+                user=self.users[user], recipe=self.recipes[recipe]
+            )
+            model.objects.filter(pk=event.pk).update(
+                created=now - timedelta(hours=hours)
+            )
+
+    def assert_scores(self):
+        """Рейтинги совпадают с суммой вкладов всех событий,
+        посчитанной заново к точке отсчёта."""
+        epoch = TrendingState.objects.get().epoch
+        expected = {}
+        for model, source in ((Favourite, 'favorite'),
+                              (ShoppingCart, 'shopping_cart')):
+            for recipe_id, created in model.objects.values_list(
+                'recipe_id', 'created'
+            ):
+                expected[recipe_id] = expected.get(recipe_id, 0) + (
+                    settings.TRENDING_WEIGHTS[source] * math.exp(
+                        -decay_rate() * (epoch - created).total_seconds()
+                    )
+                )
+        scores = dict(RecipeScore.objects.values_list('recipe_id', 'score'))
+        self.assertEqual(scores.keys(), expected.keys())
+        for recipe_id, score in expected.items():
+            self.assertAlmostEqual(scores[recipe_id], score, places=9)
+
+    def test_incremental_update_matches_recompute(self):
+        self.add_events(self.before_first_run)
+        with override_settings(TRENDING_LAG=3 * 3600):
+            call_command('compute_trending', stdout=StringIO())
+        first_epoch = TrendingState.objects.get().epoch
+        self.assertEqual(RecipeScore.objects.count(), 2)
+
+        self.add_events(self.before_second_run)
+        # Второй запуск переносит точку отсчёта.
+        with override_settings(TRENDING_LAG=0, TRENDING_REBASE_AFTER=0):
+            call_command('compute_trending', stdout=StringIO())
+        self.assertGreater(TrendingState.objects.get().epoch, first_epoch)
+        self.assert_scores()
+
+        call_command('compute_trending', '--rebuild', stdout=StringIO())
+        self.assert_scores()
+
+
+@override_settings(INDEX_VERSION_CHECK_INTERVAL=0)
+class IngredientIndexTestCase(TestCase):
+
+    def setUp(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Сахар', 'сахарная пудра', 'Соль', 'Сыр')
+        ])
+        self.index = IngredientIndex()
+
+    def assert_search(self, prefix):
+        # istartswith в SQLite не сравнивает кириллицу без учёта регистра.
+        key = prefix.strip().casefold()
+        self.assertEqual(self.index.search(prefix), [
+            item for item in Ingredient.objects.values(
+                'id', 'name', 'measurement_unit'
+            )
+            if item['name'].casefold().startswith(key)
+        ])
+
+    def test_search_matches_orm(self):
+        for prefix in ('', ' сах', 'С', 'Сы', 'Мука'):
+            with self.subTest(prefix=prefix):
+                self.assert_search(prefix)
+        # Новый ингредиент меняет штамп, индекс собирается заново.
+        Ingredient.objects.create(name='Сахарин', measurement_unit='г')
+        for prefix in ('', 'сах'):
+            with self.subTest(prefix=prefix):
+                self.assert_search(prefix)
+
+
+class IndexCacheCheckTestCase(SimpleTestCase):
+
+    def test_index_requires_shared_cache(self):
+        for enabled in INDEX_SETTINGS:
+            with self.subTest(setting=enabled), override_settings(**{
+                name: name == enabled for name in INDEX_SETTINGS
+            }):
+                errors = index_cache_check(None)
+                self.assertEqual(
+                    [error.id for error in errors], ['recipes.E001']
+                )
+                self.assertIn(enabled, errors[0].msg)
+
+    def test_shared_cache_or_disabled_index_pass(self):
+        with override_settings(**dict.fromkeys(INDEX_SETTINGS, False)):
+            self.assertEqual(index_cache_check(None), [])
+        with tempfile.TemporaryDirectory() as location, override_settings(
+            CACHES={'default': {
+                'BACKEND': settings.CACHE_BACKENDS['file'],
+                'LOCATION': location,
+            }},
+            **dict.fromkeys(INDEX_SETTINGS, True),
+        ):
+            self.assertEqual(index_cache_check(None), [])
@@ -0,0 +1,141 @@
+"""Пересчёт рейтингов RecipeScore по журналу избранного и корзин.
+
+Вклад события в рейтинг - w * exp(decay * (t - epoch)): у всех рецептов
+к текущему моменту он затухает одинаково, поэтому при каждом запуске
+достаточно добавить вклад новых событий, не трогая остальные строки.
+Когда множитель растёт слишком сильно, точка отсчёта переносится
+вперёд одним UPDATE всех рейтингов.
+
+Удаление из избранного или корзины рейтинг не уменьшает: строк
+удалённых событий в журнале нет.
+"""
+import math
+from datetime import timedelta
+from itertools import islice
+
+import numpy
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Favourite, RecipeScore, ShoppingCart, TrendingState
+
+CHUNK_SIZE = 100000
+SOURCES = {
+    'favorite': Favourite,
+    'shopping_cart': ShoppingCart,
+}
+
+
+def decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE * 3600)
+
+
+def aggregate(recipe_ids, scores):
+    """Суммирует вклады по рецептам: (уникальные id, суммы)."""
+    unique, inverse = numpy.unique(recipe_ids, return_inverse=True)
+    return unique, numpy.bincount(inverse, weights=scores)
+
+
+def event_scores(model, weight, start, end, epoch):
+    """Вклады событий model с created в (start, end] по кускам."""
+    rows = model.objects.filter(
+        created__gt=start, created__lte=end
+    ).values_list('recipe_id', 'created').order_by().iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    rate = decay_rate()
+    base = epoch.timestamp()
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        recipe_ids = numpy.fromiter(
+            (recipe_id for recipe_id, _ in chunk), numpy.int64, len(chunk)
+        )
+        ages = numpy.fromiter(
+            (created.timestamp() for _, created in chunk),
+            numpy.float64, len(chunk),
+        ) - base
+        yield aggregate(recipe_ids, weight * numpy.exp(rate * ages))
+
+
+def save_scores(recipe_ids, scores):
+    recipe_ids = recipe_ids.tolist()
+    scores = scores.tolist()
+    for start in range(0, len(recipe_ids), settings.TRENDING_BATCH_SIZE):
+        batch = dict(zip(
+            recipe_ids[start:start + settings.TRENDING_BATCH_SIZE],
+            scores[start:start + settings.TRENDING_BATCH_SIZE],
+        ))
+        existing = list(RecipeScore.objects.filter(recipe_id__in=batch))
+        for row in existing:
+            row.score += batch.pop(row.recipe_id)
+        RecipeScore.objects.bulk_update(existing, ['score'])
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe_id=recipe_id, score=score)
+             for recipe_id, score in batch.items()],
+            ignore_conflicts=True,
+        )
+
+
+def rebase(state, epoch):
+    """Переносит точку отсчёта, сохраняя порядок рейтингов."""
+    factor = math.exp(-decay_rate() * (epoch - state.epoch).total_seconds())
+    RecipeScore.objects.update(score=F('score') * factor)
+    state.epoch = epoch
+
+
+@transaction.atomic
+def update_scores(now=None):
+    """Добавляет вклад событий с прошлого запуска.
+
+    Возвращает число рецептов, чей рейтинг изменился.
+
+    Последние TRENDING_LAG секунд не обрабатываются: строки ещё
+    не закоммиченных транзакций могут получить более ранний created.
+    """
+    end = (now or timezone.now()) - timedelta(seconds=settings.TRENDING_LAG)
+    state, _ = TrendingState.objects.select_for_update().get_or_create(
+        pk=1, defaults={
+            'epoch': end,
+            'processed_until': end - timedelta(
+                hours=settings.TRENDING_HALF_LIFE * settings.TRENDING_HISTORY
+            ),
+        },
+    )
+    if end <= state.processed_until:
+        return 0
+    if (end - state.epoch).total_seconds() > (
+        settings.TRENDING_HALF_LIFE * 3600 * settings.TRENDING_REBASE_AFTER
+    ):
+        rebase(state, end)
+    parts = [
+        part
+        for source, model in SOURCES.items()
+        for part in event_scores(
+            model, settings.TRENDING_WEIGHTS[source],
+            state.processed_until, end, state.epoch,
+        )
+    ]
+    updated = 0
+    if parts:
+        recipe_ids, scores = aggregate(
+            numpy.concatenate([recipe_ids for recipe_ids, _ in parts]),
+            numpy.concatenate([scores for _, scores in parts]),
+        )
+        save_scores(recipe_ids, scores)
+        updated = len(recipe_ids)
+    state.processed_until = end
+    state.save()
+    return updated
+
+
+@transaction.atomic
+def rebuild_scores(now=None):
+    """Пересчитывает рейтинги с нуля по последним TRENDING_HISTORY
+    периодам полураспада."""
+    TrendingState.objects.all().delete()
+    RecipeScore.objects.all().delete()
+    return update_scores(now)
@@ -1,6 +1,34 @@
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
+
+from recipes import feed
+from recipes.admin import NoAddChangeAdmin
 
 from .models import Follow, User
+from .utils import forget_followed_authors
 
-admin.site.register(Follow)
 admin.site.register(User)
+
+
+@admin.register(Follow)
+class FollowAdmin(NoAddChangeAdmin):
+    """Подписки меняются через API, которое ведёт followers_count,
+    ленты и кеш подписок.
+
+    Удаление из админки делает то же, что отписка через API.
+    """
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Follow.objects.filter(pk=obj.pk))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        follows = list(queryset.values_list('user_id', 'author_id'))
+        super().delete_queryset(request, queryset)
+        for user_id, author_id in follows:
+            User.objects.filter(id=author_id).update(
+                followers_count=F('followers_count') - 1
+            )
+            feed.trim(user_id, author_id)
+            forget_followed_authors(user_id)
@@ -32,6 +32,14 @@ class User(AbstractUser):
         blank=False,
         verbose_name='Фамилия',
     )
+    recipes_count = models.IntegerField(
+        default=0,
+        verbose_name='Число рецептов',
+    )
+    followers_count = models.IntegerField(
+        default=0,
+        verbose_name='Число подписчиков',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
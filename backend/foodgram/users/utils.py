@@ -0,0 +1,55 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Follow
+
+FOLLOWED_AUTHORS_KEY = 'followed_authors:{}'
+
+
+def get_followed_author_ids(request):
+    """Множество id авторов, на которых подписан текущий пользователь.
+
+    Загружается не больше одного раза за запрос. Если задан
+    FOLLOWED_AUTHORS_CACHE_TIMEOUT, множество дополнительно хранится
+    в общем кеше по id пользователя.
+    """
+    user = request.user
+    if user.is_anonymous:
+        return frozenset()
+    author_ids = getattr(request, '_followed_author_ids', None)
+    if author_ids is not None:
+        return author_ids
+    timeout = settings.FOLLOWED_AUTHORS_CACHE_TIMEOUT
+    key = FOLLOWED_AUTHORS_KEY.format(user.id)
+    cached = cache.get(key) if timeout else None
+    if cached is None:
+        cached = list(
+            Follow.objects.filter(user=user).values_list(
+                'author_id', flat=True
+            )
+        )
+        if timeout:
+            cache.set(key, cached, timeout)
+    author_ids = frozenset(cached)
+    request._followed_author_ids = author_ids
+    return author_ids
+
+
+def forget_followed_authors(user_id):
+    """Сбрасывает множество подписок пользователя в общем кеше.
+
+    Сброс идёт после коммита: иначе параллельный запрос успел бы
+    снова положить туда старые подписки.
+    """
+    transaction.on_commit(partial(
+        cache.delete, FOLLOWED_AUTHORS_KEY.format(user_id)
+    ))
+
+
+def invalidate_followed_authors(request):
+    """Сбрасывает множество подписок после подписки или отписки."""
+    request._followed_author_ids = None
+    forget_followed_authors(request.user.id)
@@ -1,3 +1,7 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, F, Prefetch, Value,
+                              prefetch_related_objects)
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import status
@@ -5,9 +9,13 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from api import projections
 from api.pagination import CustomPagination
+from recipes import feed
+from recipes.models import Recipe
 from .models import Follow, User
 from .serializers import CustomUserSerializer, FollowSerializer
+from .utils import invalidate_followed_authors
 
 
 class UsersViewSet(UserViewSet):
@@ -21,6 +29,7 @@ class UsersViewSet(UserViewSet):
         permission_classes=[IsAuthenticated],
         serializer_class=CustomUserSerializer
     )
+    @transaction.atomic
     def subscribe(self, request, **kwargs):
         user = request.user
         author = get_object_or_404(
@@ -35,6 +44,11 @@ class UsersViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             Follow.objects.create(user=user, author=author)
+            User.objects.filter(id=author.id).update(
+                followers_count=F('followers_count') + 1
+            )
+            feed.backfill(user, author)
+            invalidate_followed_authors(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         subscription = get_object_or_404(
@@ -42,6 +56,11 @@ class UsersViewSet(UserViewSet):
             user=user,
             author=author)
         subscription.delete()
+        User.objects.filter(id=author.id).update(
+            followers_count=F('followers_count') - 1
+        )
+        feed.trim(user, author)
+        invalidate_followed_authors(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -50,8 +69,26 @@ class UsersViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(following__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+        limit = request.GET.get('recipes_limit')
+        if settings.API_PROJECTIONS_ENABLED:
+            page = self.paginate_queryset(
+                projections.subscription_page(queryset)
+            )
+            return self.get_paginated_response(projections.subscriptions(
+                page, int(limit) if limit else None
+            ))
         pages = self.paginate_queryset(queryset)
+        recipes = Recipe.objects.all()
+        if limit:
+            recipes = recipes.filter(
+                author__in=pages
+            ).limited_per_author(int(limit))
+        prefetch_related_objects(pages, Prefetch(
+            'recipes', queryset=recipes, to_attr='limited_recipes'
+        ))
         serializer = FollowSerializer(
             pages,
             many=True,